@@ -0,0 +1,220 @@
+import numpy as np
+from typing import Dict, Any, List, Optional, Tuple
+from logic import MAX_SCORE, SCORE_TABLE
+from control import NUM_CONTROLS
+from constant import (
+    NUM_TURNS, NUM_CATEGORIES, ALL_CATEGORIES, CATEGORY_INDEX, CATEGORIES, SECTION_UPPER,
+    UPPER_SECTION_BONUS_THRESHOLD, CATEGORY_YAHTZEE, RUNNING_AVG_STEP, RUNNING_AVG_BLOCKS
+)
+
+MAX_CAT_SCORE = int(SCORE_TABLE.max())
+NUM_UPPER = len(CATEGORIES[SECTION_UPPER])
+
+def hist_quantile(hist: np.ndarray, q: float) -> float:
+    cum = np.cumsum(hist)
+    pos = q / 100 * (cum[-1] - 1)
+    lo, hi = np.searchsorted(cum, [np.floor(pos), np.ceil(pos)], side="right")
+    return lo + (hi - lo) * (pos - np.floor(pos))
+
+def hist_duel(h1: np.ndarray, h2: np.ndarray) -> Tuple[float, float, float]:
+    p1 = h1 / h1.sum()
+    p2 = h2 / h2.sum()
+    below = np.cumsum(p2) - p2
+    win = float(p1 @ below)
+    tie = float(p1 @ p2)
+    return win, tie, 1 - win - tie
+
+def _pairs(vals: List[int]) -> List[int]:
+    return [sum(vals[i:i + 2]) for i in range(0, len(vals), 2)]
+
+class GameAgg:
+    def __init__(self, seq: bool = False, cv: bool = False):
+        self.n = 0
+        self.hist = np.zeros(MAX_SCORE + 1, dtype=np.int64)
+        self.bonus = 0
+        self.ytz = 0
+        self.cat_hist = np.zeros((NUM_CATEGORIES, MAX_CAT_SCORE + 1), dtype=np.int64)
+        self.turn_hist = np.zeros((NUM_TURNS, NUM_CATEGORIES), dtype=np.int64)
+        self.seq: Optional[list] = list() if seq else None
+        self.mom = np.zeros((NUM_CONTROLS + 2, NUM_CONTROLS + 2))
+        self.unit = 1
+        self.cv = cv
+        self.run_step = RUNNING_AVG_STEP
+        self.run_sum: Optional[List[int]] = list()
+        self.run_cnt: Optional[List[int]] = list()
+
+    @classmethod
+    def from_results(cls, res: List[Dict[str, Any]], seq: bool = False, cv: bool = False) -> "GameAgg":
+        agg = cls(seq, cv)
+        for r in res:
+            agg.add(r)
+        return agg
+
+    def add(self, r: Dict[str, Any], unit: bool = True) -> None:
+        if unit:
+            self._moment(r["score"], r["luck"] if self.cv else None)
+        self.n += 1
+        self.hist[r["score"]] += 1
+        if self.run_cnt is not None:
+            if not self.run_cnt or self.run_cnt[-1] >= self.run_step:
+                self.run_sum.append(0)
+                self.run_cnt.append(0)
+                if len(self.run_cnt) > RUNNING_AVG_BLOCKS:
+                    self._coarsen()
+            self.run_sum[-1] += r["score"]
+            self.run_cnt[-1] += 1
+        self.bonus += bool(r["bonus"])
+        self.ytz += (r["ytz"] or 0) > 0
+        for turn, cat in enumerate(r["cats"]):
+            self.turn_hist[turn, CATEGORY_INDEX[cat]] += 1
+        for cat, sc in r["all_scores"].items():
+            if sc is not None:
+                self.cat_hist[CATEGORY_INDEX[cat], sc] += 1
+        if self.seq is not None:
+            self.seq.append(r["score"])
+
+    def add_pair(self, r1: Dict[str, Any], r2: Dict[str, Any]) -> None:
+        self.add(r1, False)
+        self.add(r2, False)
+        self._moment((r1["score"] + r2["score"]) / 2, (r1["luck"] + r2["luck"]) / 2 if self.cv else None)
+        self.unit = 2
+
+    def _moment(self, score: float, luck: Optional[np.ndarray]) -> None:
+        if luck is None:
+            self.mom[:2, :2] += ((1.0, score), (score, score * score))
+        else:
+            z = np.concatenate(((1.0, score), luck))
+            self.mom += np.outer(z, z)
+
+    def add_batch(self, score: np.ndarray, all_scores: np.ndarray, cats: np.ndarray) -> None:
+        self.n += len(score)
+        self.hist += np.bincount(score, minlength=len(self.hist))
+        if self.run_cnt is not None:
+            self._add_blocks(score)
+        self.bonus += int((all_scores[:, :NUM_UPPER].sum(axis=1) >= UPPER_SECTION_BONUS_THRESHOLD).sum())
+        self.ytz += int((all_scores[:, CATEGORY_INDEX[CATEGORY_YAHTZEE]] > 0).sum())
+        for c in range(NUM_CATEGORIES):
+            self.cat_hist[c] += np.bincount(all_scores[:, c], minlength=MAX_CAT_SCORE + 1)
+        for t in range(NUM_TURNS):
+            self.turn_hist[t] += np.bincount(cats[:, t], minlength=NUM_CATEGORIES)
+        if self.seq is not None:
+            self.seq.extend(score.tolist())
+
+    def _add_blocks(self, score: np.ndarray) -> None:
+        fill = min(len(score), max(self.run_step - self.run_cnt[-1], 0)) if self.run_cnt else 0
+        if fill:
+            self.run_sum[-1] += int(score[:fill].sum())
+            self.run_cnt[-1] += fill
+        while len(score) - fill > self.run_step * (RUNNING_AVG_BLOCKS - len(self.run_cnt)):
+            self._coarsen()
+        starts = np.arange(fill, len(score), self.run_step)
+        if len(starts):
+            self.run_sum += np.add.reduceat(score.astype(np.int64), starts).tolist()
+            self.run_cnt += np.diff(np.append(starts, len(score))).tolist()
+
+    def merge(self, other: "GameAgg") -> "GameAgg":
+        self.n += other.n
+        self.hist += other.hist
+        self.bonus += other.bonus
+        self.ytz += other.ytz
+        self.cat_hist += other.cat_hist
+        self.turn_hist += other.turn_hist
+        self.mom += other.mom
+        self.unit = max(self.unit, other.unit)
+        if other.run_cnt is None:
+            self.run_sum = self.run_cnt = None
+        while self.run_cnt is not None and self.run_step < other.run_step:
+            self._coarsen()
+        for s, c in zip(other.run_sum or (), other.run_cnt or ()):
+            if self.run_cnt is None:
+                break
+            if self.run_cnt and self.run_cnt[-1] + c <= self.run_step:
+                self.run_sum[-1] += s
+                self.run_cnt[-1] += c
+            else:
+                self.run_sum.append(s)
+                self.run_cnt.append(c)
+                if len(self.run_cnt) > RUNNING_AVG_BLOCKS:
+                    self._coarsen()
+        if self.seq is not None:
+            self.seq.extend(other.seq)
+        return self
+
+    def _coarsen(self) -> None:
+        self.run_sum = _pairs(self.run_sum)
+        self.run_cnt = _pairs(self.run_cnt)
+        self.run_step *= 2
+
+    @property
+    def cat_use(self) -> np.ndarray:
+        return self.turn_hist.sum(axis=0)
+
+    @property
+    def cat_cnt(self) -> np.ndarray:
+        return self.cat_hist.sum(axis=1)
+
+    @property
+    def cat_sum(self) -> np.ndarray:
+        return self.cat_hist @ np.arange(MAX_CAT_SCORE + 1)
+
+    def mean(self) -> float:
+        return int(self.hist @ np.arange(len(self.hist))) / self.n
+
+    def std(self) -> float:
+        vals = np.arange(len(self.hist))
+        s1 = int(self.hist @ vals)
+        s2 = int(self.hist @ (vals * vals))
+        return (self.n * s2 - s1 * s1) ** 0.5 / self.n
+
+    def quantile(self, q: float) -> float:
+        return float(hist_quantile(self.hist, q))
+
+    def min(self) -> int:
+        return int(np.flatnonzero(self.hist)[0])
+
+    def max(self) -> int:
+        return int(np.flatnonzero(self.hist)[-1])
+
+    def scores(self) -> Optional[np.ndarray]:
+        return None if self.seq is None else np.array(self.seq, dtype=np.int64)
+
+    def running_avg(self, win: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        if self.run_cnt is None:
+            return None
+        if not self.run_cnt:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        s = np.concatenate(([0], np.cumsum(self.run_sum, dtype=np.int64)))
+        c = np.concatenate(([0], np.cumsum(self.run_cnt, dtype=np.int64)))
+        end = np.flatnonzero(c >= min(win, c[-1]))
+        start = np.searchsorted(c, c[end] - win, side="right") - 1
+        start = np.maximum(start, 0)
+        return c[end], (s[end] - s[start]) / (c[end] - c[start])
+
+    def cat_avg_turn(self) -> Dict[str, float]:
+        use = self.cat_use
+        turns = np.arange(1, NUM_TURNS + 1) @ self.turn_hist
+        return {cat: turns[c] / use[c] for c, cat in enumerate(ALL_CATEGORIES) if use[c]}
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = dict(self.__dict__)
+        if self.run_cnt is not None:
+            state["run_sum"] = np.array(self.run_sum, dtype=np.int32)
+            state["run_cnt"] = np.array(self.run_cnt, dtype=np.int32)
+        if self.seq is not None:
+            state["seq"] = np.array(self.seq, dtype=np.uint16)
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.cv = state.get("cv", bool(self.mom[2:, 2:].any()))
+        self.run_step = state.get("run_step", RUNNING_AVG_STEP)
+        if self.seq is not None:
+            self.seq = np.asarray(self.seq).tolist()
+        if "run_cnt" not in state:
+            self.run_sum = self.run_cnt = None
+            if self.seq is not None:
+                self.run_sum, self.run_cnt = list(), list()
+                self._add_blocks(np.array(self.seq, dtype=np.int64))
+        elif self.run_cnt is not None:
+            self.run_sum = np.asarray(self.run_sum, dtype=np.int64).tolist()
+            self.run_cnt = np.asarray(self.run_cnt, dtype=np.int64).tolist()
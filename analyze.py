@@ -1,50 +1,57 @@
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 import os
-from collections import defaultdict
-from typing import Dict, List, Tuple, Any
+from typing import Dict, List, Tuple, Any, Optional
 from constant import (
-    DEFAULT_HEAD_TO_HEAD_GAMES, DEFAULT_VISUALIZATION_GAMES, DEFAULT_TOURNAMENT_GAMES,
+    DEFAULT_WORKERS, DEFAULT_HEAD_TO_HEAD_GAMES, DEFAULT_VISUALIZATION_GAMES, DEFAULT_TOURNAMENT_GAMES,
+    DEFAULT_RACE_PRECISION, DEFAULT_RACE_ROUND, RACE_Z,
     FIGURE_WIDTH, FIGURE_HEIGHT, TOURNAMENT_DIR, TOURNAMENT_RESULTS_FILE
 )
 from strats import STRATEGIES
-from util import game_run, calc_stats, calc_cat_stats, print_strategy_list, get_valid_int
+from util import calc_stats, calc_cat_stats, print_strategy_list, get_valid_int
+from runner import run_games
+from logic import sub_seed
+from store import open_store
+from agg import GameAgg, hist_duel
+from cli import common_parser, apply_common
 
-def head_to_head(s1: str, s2: str, n_games: int = DEFAULT_HEAD_TO_HEAD_GAMES) -> Tuple[Dict[str, int], List[int]]:
-    print("running head-to-head: %s vs %s" % (s1, s2))
+def head_to_head(s1: str, s2: str, n_games: int = DEFAULT_HEAD_TO_HEAD_GAMES,
+                 workers: int = DEFAULT_WORKERS, seed: Optional[int] = None,
+                 paired: bool = True) -> Tuple[Dict[str, int], List[int]]:
+    print("running head-to-head: %s vs %s%s" % (s1, s2, " (paired dice)" if paired else ""))
+    seeds = (sub_seed(seed, 0),) * 2 if paired else (sub_seed(seed, 0), sub_seed(seed, 1))
+    sc1, sc2 = (
+        run_games(s, n_games, sd, workers, seq=True, cache=seed is not None, crn=paired).scores()
+        for s, sd in zip((s1, s2), seeds)
+    )
     wins: Dict[str, int] = {
-        s1: 0,
-        s2: 0, "tie": 0
+        s1: int(np.sum(sc1 > sc2)),
+        s2: int(np.sum(sc2 > sc1)), "tie": int(np.sum(sc1 == sc2))
     }
-    diffs: List[int] = list()
-    for __ in range(n_games):
-        sc1 = game_run(s1)['score']
-        sc2 = game_run(s2)['score']
-        if sc1 > sc2:
-            wins[s1] += 1
-        elif sc2 > sc1:
-            wins[s2] += 1
-        else:
-            wins['tie'] += 1
-        diffs.append(sc1 - sc2)
+    diffs: List[int] = (sc1 - sc2).tolist()
     
     print("\nresults after %d games:" % n_games)
     print("%s wins:%d (%.2f%%)" % (s1, wins[s1], wins[s1]/n_games*100))
     print("%s wins: %d (%.2f%%)" % (s2, wins[s2], wins[s2]/n_games*100))
     print("ties: %d(%.2f%%)" % (wins['tie'], wins['tie']/n_games*100))
     print("average score difference: %.2f" % np.mean(diffs))
+    if paired and n_games > 1:
+        var_ind = np.var(sc1, ddof=1) + np.var(sc2, ddof=1)
+        var_pair = np.var(diffs, ddof=1)
+        red = var_ind / var_pair if var_pair else float("inf")
+        print("paired difference variance: %.1f vs %.1f independent (%.1fx reduction, worth ~%d independent games)"
+              % (var_pair, var_ind, red, red * n_games))
     
     return wins, diffs
 
-def analyze_consist(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES) -> Dict[str, Any]:
+def analyze_consist(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES,
+                    workers: int = DEFAULT_WORKERS, seed: Optional[int] = None,
+                    store: Optional[str] = None) -> Dict[str, Any]:
     print("analyzing consistency for %s.." % strat)
-    res = [game_run(strat) for _ in range(n_games)]
+    res = open_store(store).to_agg() if store else run_games(strat, n_games, seed, workers)
     stats = calc_stats(res)
     cat_stats = calc_cat_stats(res)
-    cat_turns = defaultdict(list)
-    for r in res:
-        for turn, cat in enumerate(r["cats"]):
-            cat_turns[cat].append(turn + 1)
+    cat_turns = res.cat_avg_turn()
     
     print("\nconsistency analysis for %s:" % strat)
     print("interquartile range (iqr): %.2f" % (stats["q3"] - stats["q1"]))
@@ -55,7 +62,7 @@ def analyze_consist(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES) -> D
     print("\ncategory usage patterns:")
     for cat in sorted(cat_stats["scores"].keys()):
         avg_score = cat_stats["scores"][cat]
-        avg_turn = np.mean(cat_turns[cat])
+        avg_turn = cat_turns[cat]
         print("\t%s: avg score %.2f, avg turn %.1f" % (cat, avg_score, avg_turn))
     
     print("\ncategory turn distribution (when each category is typically used):")
@@ -63,8 +70,7 @@ def analyze_consist(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES) -> D
     mid_cats = list()
     late_cats = list()
     
-    for cat, turns in cat_turns.items():
-        avg_turn = np.mean(turns)
+    for cat, avg_turn in cat_turns.items():
         if avg_turn <= 4:
             early_cats.append((cat, avg_turn))
         elif avg_turn <= 9:
@@ -86,17 +92,72 @@ def analyze_consist(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES) -> D
     
     return stats
 
-def tournament_start(n_games: int = DEFAULT_TOURNAMENT_GAMES) -> Tuple[np.ndarray, np.ndarray]:
+def tournament_start(n_games: int = DEFAULT_TOURNAMENT_GAMES, workers: int = DEFAULT_WORKERS,
+                     seed: Optional[int] = None,
+                     stores: Optional[Dict[str, str]] = None) -> Tuple[np.ndarray, np.ndarray]:
     strats = list(STRATEGIES.keys())
+    n = len(strats)
+    stores = stores or dict()
+    aggs = [
+        open_store(stores[s]).to_agg() if s in stores else run_games(s, n_games, seed, workers, cache=seed is not None)
+        for s in strats
+    ]
+    return _tournament_report(strats, tournament_matrix(strats, aggs))
+
+def tournament_matrix(strats: List[str], aggs: List[GameAgg], verbose: bool = True) -> np.ndarray:
     n = len(strats)
     res = np.zeros((n,n))
     for i in range(n):
         for j in range(i+1,n):
-            s1 = strats[i]
-            s2 = strats[j]
-            wins,_ = head_to_head(s1,s2,n_games)
-            res[i,j] = wins[s1]/n_games * 100
-            res[j,i] = wins[s2]/n_games * 100
+            win, tie, loss = hist_duel(aggs[i].hist, aggs[j].hist)
+            res[i,j] = win * 100
+            res[j,i] = loss * 100
+            if verbose:
+                print("%s vs %s: %.2f%% / %.2f%% / %.2f%% (win/tie/loss), average score difference: %.2f"
+                      % (strats[i], strats[j], win*100, tie*100, loss*100, aggs[i].mean() - aggs[j].mean()))
+    return res
+
+def _wilson_half(k: np.ndarray, n: np.ndarray, z: float = RACE_Z) -> np.ndarray:
+    p = k / n
+    return z * np.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n) * 100
+
+def race_tournament(n_games: int = DEFAULT_TOURNAMENT_GAMES, workers: int = DEFAULT_WORKERS,
+                    seed: Optional[int] = None, precision: float = DEFAULT_RACE_PRECISION,
+                    round_games: int = DEFAULT_RACE_ROUND) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    strats = list(STRATEGIES.keys())
+    n = len(strats)
+    wins = np.zeros((n, n), dtype=np.int64)
+    played = np.zeros((n, n), dtype=np.int64)
+    live = [(i, j) for i in range(n) for j in range(i+1, n)]
+    budget = n_games * len(live)
+    rnd = 0
+    while live and budget >= len(live):
+        k = min(round_games, budget // len(live))
+        rs = sub_seed(seed, rnd)
+        scs = {
+            i: run_games(strats[i], k, rs, workers, seq=True, cache=seed is not None, crn=True).scores()
+            for i in sorted({s for pair in live for s in pair})
+        }
+        budget -= k * len(live)
+        for i, j in live:
+            wins[i, j] += int(np.sum(scs[i] > scs[j]))
+            wins[j, i] += int(np.sum(scs[j] > scs[i]))
+            played[i, j] += k
+            played[j, i] += k
+        live = [
+            (i, j) for i, j in live
+            if max(_wilson_half(wins[i, j], played[i, j]), _wilson_half(wins[j, i], played[i, j])) > precision
+        ]
+        rnd += 1
+    print("racing tournament used %d of %d games, %d pairings unresolved"
+          % (played.sum() // 2, n_games * n * (n-1) // 2, len(live)))
+    res = 100 * wins / np.maximum(played, 1)
+    res, win_pcts = _tournament_report(strats, res, played)
+    return res, win_pcts, played
+
+def _tournament_report(strats: List[str], res: np.ndarray,
+                       played: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    n = len(strats)
     win_pcts = np.sum(res,axis=1)/(n-1)
     print("\ntournament results:")
     idxs = np.argsort(win_pcts)[::-1]
@@ -104,6 +165,12 @@ def tournament_start(n_games: int = DEFAULT_TOURNAMENT_GAMES) -> Tuple[np.ndarra
         s = strats[idx]
         print("%d. %s: %.2f%% average win rate" % (i+1,s,win_pcts[idx]))
     
+    plot_tournament(strats, res, played)
+    return res,win_pcts
+
+def plot_tournament(strats: List[str], res: np.ndarray, played: Optional[np.ndarray] = None) -> str:
+    import matplotlib.pyplot as plt
+    n = len(strats)
     plt.figure(figsize=(FIGURE_WIDTH,FIGURE_HEIGHT))
     plt.imshow(res,cmap='YlGnBu')
     plt.colorbar(label='win %')
@@ -113,7 +180,8 @@ def tournament_start(n_games: int = DEFAULT_TOURNAMENT_GAMES) -> Tuple[np.ndarra
     for i in range(n):
         for j in range(n):
             if i != j:
-                plt.text(j, i, "%.1f%%" % res[i,j],ha='center', va='center', 
+                label = "%.1f%%" % res[i,j] if played is None else "%.1f%%\nn=%d" % (res[i,j], played[i,j])
+                plt.text(j, i, label,ha='center', va='center', 
                          color='black' if res[i, j] < 50 else 'white')
             else:
                 plt.text(j, i,"X", ha='center', va='center')
@@ -121,47 +189,66 @@ def tournament_start(n_games: int = DEFAULT_TOURNAMENT_GAMES) -> Tuple[np.ndarra
     plt.tight_layout()
     out = os.path.join(TOURNAMENT_DIR, TOURNAMENT_RESULTS_FILE)
     plt.savefig(out)
+    plt.close()
     print("\ntournament results heatmap saved as '%s'" % out)
-    
-    return res,win_pcts
+    return out
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="yahtzee strategy analysis tool", parents=[common_parser()])
+    parser.add_argument("--independent", action="store_true", help="play head-to-head games on independent dice")
+    parser.add_argument("--race", action="store_true", help="stop tournament pairings once their win rate is resolved")
+    parser.add_argument("--precision", type=float, default=DEFAULT_RACE_PRECISION, help="racing tournament win-rate precision (percentage points)")
+    parser.add_argument("--store", default=None, help="analyze a saved result store instead of simulating")
+    args = parser.parse_args(argv)
+    apply_common(args)
+
+    print("yahtzee strategy analysis tool")
+    print("\n1.) run head-to-head comparison")
+    print("2.) analyze strategy consistency")
+    print("3.) run full tournament")
+    print("4.) exit")
 
-print("yahtzee strategy analysis tool")
-print("\n1.) run head-to-head comparison")
-print("2.) analyze strategy consistency")
-print("3.) run full tournament")
-print("4.) exit")
-
-try:
-    while True:
-        choice = input("\nenter your choice (1-4): ")
-        if choice not in ["1", "2", "3", "4"]:
-            print("please enter a number between 1 and 4")
-            continue
-        if choice == "1":
-            print_strategy_list()
-            strats = list(STRATEGIES.keys())
-            idx1 = get_valid_int("\nselect first strategy (number): ", 1, len(strats)) - 1
-            idx2 = get_valid_int("select second strategy (number): ", 1, len(strats)) - 1
-            if idx1 == idx2:
-                print("please select two different strategies")
+    try:
+        while True:
+            choice = input("\nenter your choice (1-4): ")
+            if choice not in ["1", "2", "3", "4"]:
+                print("please enter a number between 1 and 4")
                 continue
-            head_to_head(strats[idx1], strats[idx2], DEFAULT_HEAD_TO_HEAD_GAMES)
-            break
-        elif choice == "2":
-            print_strategy_list()
-            strats = list(STRATEGIES.keys())
-            
-            idx = get_valid_int("\nselect strategy to analyze (number): ", 1, len(strats)) - 1
-            analyze_consist(strats[idx], DEFAULT_VISUALIZATION_GAMES)
-            break
-            
-        elif choice == "3":
-            tournament_start(DEFAULT_TOURNAMENT_GAMES)
-            break
-            
-        elif choice == "4":
-            print("exiting..")
-            break
-            
-except KeyboardInterrupt:
-    print("\nexiting..")
\ No newline at end of file
+            if choice == "1":
+                print_strategy_list()
+                strats = list(STRATEGIES.keys())
+                idx1 = get_valid_int("\nselect first strategy (number): ", 1, len(strats)) - 1
+                idx2 = get_valid_int("select second strategy (number): ", 1, len(strats)) - 1
+                if idx1 == idx2:
+                    print("please select two different strategies")
+                    continue
+                head_to_head(strats[idx1], strats[idx2], DEFAULT_HEAD_TO_HEAD_GAMES, args.workers, args.seed,
+                             not args.independent)
+                break
+            elif choice == "2":
+                if args.store:
+                    analyze_consist(open_store(args.store).meta["strategy"], store=args.store)
+                    break
+                print_strategy_list()
+                strats = list(STRATEGIES.keys())
+
+                idx = get_valid_int("\nselect strategy to analyze (number): ", 1, len(strats)) - 1
+                analyze_consist(strats[idx], DEFAULT_VISUALIZATION_GAMES, args.workers, args.seed)
+                break
+
+            elif choice == "3":
+                if args.race:
+                    race_tournament(DEFAULT_TOURNAMENT_GAMES, args.workers, args.seed, args.precision)
+                else:
+                    tournament_start(DEFAULT_TOURNAMENT_GAMES, args.workers, args.seed)
+                break
+
+            elif choice == "4":
+                print("exiting..")
+                break
+
+    except KeyboardInterrupt:
+        print("\nexiting..")
+
+if __name__ == "__main__":
+    main()
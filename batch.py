@@ -0,0 +1,122 @@
+import numpy as np
+from typing import Any, Dict, List, Callable, Optional
+from logic import Scorecard, SCORE_TABLE, hand_idx_arr, dice_code_arr
+from constant import (
+    NUM_DICE, NUM_SIDES, NUM_ROLLS, NUM_TURNS, NUM_CATEGORIES, ALL_CATEGORIES, CATEGORY_INDEX,
+    CATEGORIES, SECTION_UPPER, UPPER_SECTION_BONUS_THRESHOLD, UPPER_SECTION_BONUS_SCORE,
+    CATEGORY_YAHTZEE
+)
+from strats import STRATEGIES, pad_keep
+
+NUM_UPPER = len(CATEGORIES[SECTION_UPPER])
+MAX_UPPER = NUM_DICE * sum(range(1, NUM_SIDES + 1)) + 1
+BATCH_CHUNK = 1 << 17
+BATCH_MEMO = 1 << 16
+_BITS = 1 << np.arange(NUM_CATEGORIES, dtype=np.int64)
+
+class BatchCard:
+    def __init__(self, n: int):
+        self.scores = np.zeros((n, NUM_CATEGORIES), dtype=np.int16)
+        self.used = np.zeros((n, NUM_CATEGORIES), dtype=bool)
+
+    def mask(self) -> np.ndarray:
+        return self.used @ _BITS
+
+    def upper(self) -> np.ndarray:
+        return self.scores[:, :NUM_UPPER].sum(axis=1, dtype=np.int64)
+
+    def card(self, i: int) -> Scorecard:
+        card = Scorecard()
+        for c in np.flatnonzero(self.used[i]):
+            card.set_score(ALL_CATEGORIES[c], int(self.scores[i, c]))
+        return card
+
+    def rec_score(self, cats: np.ndarray, hidx: np.ndarray) -> None:
+        rows = np.arange(len(cats))
+        ok = ~self.used[rows, cats]
+        rows, cats = rows[ok], cats[ok]
+        self.scores[rows, cats] = SCORE_TABLE[hidx[ok], cats]
+        self.used[rows, cats] = True
+
+def _state_keys(dice: np.ndarray, card: BatchCard) -> np.ndarray:
+    return (dice_code_arr(dice) << NUM_CATEGORIES | card.mask()) * MAX_UPPER + card.upper()
+
+def _loop_decide(fn: Callable, out: Callable) -> Callable:
+    seen: Dict[int, Any] = dict()
+    def decide(dice: np.ndarray, card: BatchCard, *left: int) -> np.ndarray:
+        keys = _state_keys(dice, card)
+        if left:
+            keys = keys * NUM_ROLLS + left[0]
+        keys, first, inv = np.unique(keys, return_index=True, return_inverse=True)
+        res = list()
+        if len(seen) + len(keys) > BATCH_MEMO:
+            seen.clear()
+        for k, i in zip(keys.tolist(), first.tolist()):
+            if k not in seen:
+                seen[k] = out(fn(dice[i].tolist(), card.card(i), *left))
+            res.append(seen[k])
+        return np.array(res)[inv.ravel()]
+    decide.rolls_left = getattr(fn, "rolls_left", False)
+    return decide
+
+def loop_reroll(fn: Callable) -> Callable:
+    return _loop_decide(fn, lambda keep: np.array(pad_keep(keep), dtype=np.int8))
+
+def loop_score(fn: Callable) -> Callable:
+    return _loop_decide(fn, CATEGORY_INDEX.__getitem__)
+
+def has_kernels(strat_name: str) -> bool:
+    strat = STRATEGIES[strat_name]
+    return "batch_reroll" in strat and "batch_score" in strat
+
+def batch_strat(strat_name: str) -> Dict[str, Callable]:
+    strat = STRATEGIES[strat_name]
+    return {
+        "reroll": strat.get("batch_reroll") or loop_reroll(strat["reroll"]),
+        "score": strat.get("batch_score") or loop_score(strat["score"])
+    }
+
+def _play_chunk(strat: Dict[str, Callable], n: int, rng: np.random.Generator) -> Dict[str, np.ndarray]:
+    card = BatchCard(n)
+    cats = np.zeros((n, NUM_TURNS), dtype=np.uint8)
+    for t in range(NUM_TURNS):
+        dice = rng.integers(1, NUM_SIDES + 1, (n, NUM_DICE), dtype=np.int8)
+        live = np.arange(n)
+        for left in range(NUM_ROLLS - 1, 0, -1):
+            args = (left,) if getattr(strat["reroll"], "rolls_left", False) else ()
+            keep = strat["reroll"](dice[live], _sub(card, live), *args)
+            new = rng.integers(1, NUM_SIDES + 1, keep.shape, dtype=np.int8)
+            dice[live] = np.where(keep > 0, keep, new)
+            live = live[~(keep > 0).all(axis=1)]
+            if not len(live):
+                break
+        cat = np.asarray(strat["score"](dice, card), dtype=np.int64)
+        card.rec_score(cat, hand_idx_arr(dice))
+        cats[:, t] = cat
+
+    upper = card.upper()
+    bonus = upper >= UPPER_SECTION_BONUS_THRESHOLD
+    return {
+        "score": card.scores.sum(axis=1, dtype=np.int64) + bonus * UPPER_SECTION_BONUS_SCORE,
+        "upper": upper,
+        "bonus": bonus,
+        "ytz": card.scores[:, CATEGORY_INDEX[CATEGORY_YAHTZEE]].copy(),
+        "cats": cats,
+        "all_scores": card.scores
+    }
+
+def _sub(card: BatchCard, rows: np.ndarray) -> BatchCard:
+    if len(rows) == len(card.scores):
+        return card
+    sub = BatchCard.__new__(BatchCard)
+    sub.scores = card.scores[rows]
+    sub.used = card.used[rows]
+    return sub
+
+def play_batch(strat_name: str, n: int, seed: Optional[int] = None,
+               chunk: int = BATCH_CHUNK) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    parts: List[Dict[str, np.ndarray]] = [
+        _play_chunk(batch_strat(strat_name), min(chunk, n - i), rng) for i in range(0, n, chunk)
+    ]
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]} if parts else dict()
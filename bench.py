@@ -0,0 +1,177 @@
+import argparse
+import gc
+import json
+import platform
+import sys
+import time
+import numpy as np
+from typing import Any, Callable, Dict, List, Tuple
+from logic import (
+    Scorecard, DiceSource, calc_upper, calc_n_of_kind, calc_full_house, calc_str, calc_yahtzee, calc_score
+)
+from util import turn_init, game_run
+from strats import STRATEGIES
+from constant import NUM_DICE, NUM_SIDES, NUM_ROLLS, ALL_CATEGORIES, NUM_CATEGORIES, VALUES
+
+BENCH_SEED = 1234
+BENCH_POSITIONS = 2000
+BENCH_GAMES = 200
+BENCH_REPEAT = 5
+BENCH_THRESHOLD = 0.10
+GROUPS = ("micro", "strat", "turn", "game")
+
+def corpus(n: int = BENCH_POSITIONS, seed: int = BENCH_SEED) -> List[Tuple[List[int], Scorecard]]:
+    rng = np.random.default_rng(seed)
+    hands = rng.integers(1, NUM_SIDES + 1, (n, NUM_DICE)).tolist()
+    res = list()
+    for dice, mask in zip(hands, rng.integers(0, (1 << NUM_CATEGORIES) - 1, n).tolist()):
+        card = Scorecard()
+        for c, cat in enumerate(ALL_CATEGORIES):
+            if mask >> c & 1:
+                card.rec_score(cat, rng.integers(1, NUM_SIDES + 1, NUM_DICE).tolist())
+        res.append((dice, card))
+    return res
+
+def timeit(fn: Callable[[], Any], ops: int, repeat: int = BENCH_REPEAT) -> Dict[str, float]:
+    best = None
+    was_on = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            t = time.perf_counter_ns()
+            fn()
+            dt = time.perf_counter_ns() - t
+            best = dt if best is None else min(best, dt)
+    finally:
+        if was_on:
+            gc.enable()
+    return {"ns_per_op": best / ops, "ops_per_sec": ops * 1e9 / best, "ops": ops}
+
+def bench_micro(pos: List[Tuple[List[int], Scorecard]], repeat: int) -> Dict[str, Dict[str, float]]:
+    hands = [dice for dice, _ in pos]
+    n = len(hands)
+    res = {
+        "calc_upper": timeit(lambda: [calc_upper(d, v) for d in hands for v in VALUES.values()], n * len(VALUES), repeat),
+        "calc_n_of_kind": timeit(lambda: [calc_n_of_kind(d, k) for d in hands for k in (3, 4)], n * 2, repeat),
+        "calc_full_house": timeit(lambda: [calc_full_house(d) for d in hands], n, repeat),
+        "calc_str": timeit(lambda: [calc_str(d, k) for d in hands for k in (4, 5)], n * 2, repeat),
+        "calc_yahtzee": timeit(lambda: [calc_yahtzee(d) for d in hands], n, repeat),
+        "calc_score": timeit(lambda: [calc_score(c, d) for d in hands for c in ALL_CATEGORIES], n * NUM_CATEGORIES, repeat),
+    }
+    groups = [hands[i:i + NUM_CATEGORIES] for i in range(0, n - NUM_CATEGORIES + 1, NUM_CATEGORIES)]
+
+    def fill():
+        for grp in groups:
+            card = Scorecard()
+            for cat, dice in zip(ALL_CATEGORIES, grp):
+                card.rec_score(cat, dice)
+
+    res["Scorecard.rec_score"] = timeit(fill, len(groups) * NUM_CATEGORIES, repeat)
+    return res
+
+def _reroll_call(fn: Callable) -> Callable:
+    if getattr(fn, "rolls_left", False):
+        return lambda dice, card: fn(dice, card, NUM_ROLLS - 1)
+    return fn
+
+def bench_strat(pos: List[Tuple[List[int], Scorecard]], repeat: int) -> Dict[str, Dict[str, float]]:
+    res = dict()
+    live = [(dice, card) for dice, card in pos if card.get_avail_cats()]
+    for name, strat in STRATEGIES.items():
+        re, sc = _reroll_call(strat["reroll"]), strat["score"]
+        res["%s.reroll" % name] = timeit(lambda: [re(list(d), c) for d, c in live], len(live), repeat)
+        res["%s.score" % name] = timeit(lambda: [sc(list(d), c) for d, c in live], len(live), repeat)
+    return res
+
+def bench_turn(pos: List[Tuple[List[int], Scorecard]], repeat: int) -> Dict[str, Dict[str, float]]:
+    res = dict()
+    live = [(dice, card) for dice, card in pos if card.get_avail_cats()]
+    for name, strat in STRATEGIES.items():
+        fn = strat["reroll"]
+
+        def run():
+            src = DiceSource(BENCH_SEED)
+            for d, c in live:
+                turn_init(fn, list(d), c, src)
+
+        res["%s.turn_init" % name] = timeit(run, len(live), repeat)
+    return res
+
+def bench_game(n_games: int, repeat: int) -> Dict[str, Dict[str, float]]:
+    res = dict()
+    for name in STRATEGIES:
+        game_run(name, DiceSource(BENCH_SEED))
+
+        def run():
+            src = DiceSource(BENCH_SEED)
+            for _ in range(n_games):
+                game_run(name, src)
+
+        res["%s.game_run" % name] = timeit(run, n_games, repeat)
+    return res
+
+def run_bench(groups: Tuple[str, ...] = GROUPS, n_pos: int = BENCH_POSITIONS, n_games: int = BENCH_GAMES,
+              repeat: int = BENCH_REPEAT) -> Dict[str, Any]:
+    pos = corpus(n_pos)
+    res: Dict[str, Dict[str, float]] = dict()
+    for grp in groups:
+        t = time.time()
+        if grp == "game":
+            res.update(bench_game(n_games, repeat))
+        else:
+            res.update({"micro": bench_micro, "strat": bench_strat, "turn": bench_turn}[grp](pos, repeat))
+        print("%s benchmarks done in %.1fs" % (grp, time.time() - t), file=sys.stderr)
+    return {
+        "meta": {
+            "python": platform.python_version(), "numpy": np.__version__, "machine": platform.machine(),
+            "platform": platform.platform(), "seed": BENCH_SEED, "positions": n_pos, "games": n_games,
+            "repeat": repeat, "time": time.strftime("%Y-%m-%dT%H:%M:%S")
+        },
+        "results": res
+    }
+
+def compare(base: Dict[str, Any], cur: Dict[str, Any], threshold: float = BENCH_THRESHOLD) -> List[str]:
+    regs = list()
+    print("%-45s %12s %12s %8s" % ("benchmark", "base ns/op", "cur ns/op", "change"))
+    for name, r in cur["results"].items():
+        b = base["results"].get(name)
+        if b is None:
+            print("%-45s %12s %12.1f %8s" % (name, "-", r["ns_per_op"], "new"))
+            continue
+        change = r["ns_per_op"] / b["ns_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regs.append(name)
+        elif change < -threshold:
+            flag = "  faster"
+        print("%-45s %12.1f %12.1f %+7.1f%%%s" % (name, b["ns_per_op"], r["ns_per_op"], change * 100, flag))
+    return regs
+
+def _load(path: str) -> Dict[str, Any]:
+    with open(path) as f:
+        return json.load(f)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="yahtzee hot-path benchmarks")
+    parser.add_argument("--out", default=None, help="write results as json to this file")
+    parser.add_argument("--compare", default=None, help="baseline json to compare against")
+    parser.add_argument("--current", default=None, help="compare a saved run instead of benchmarking now")
+    parser.add_argument("--only", nargs="+", choices=GROUPS, default=list(GROUPS), help="benchmark groups to run")
+    parser.add_argument("--positions", type=int, default=BENCH_POSITIONS)
+    parser.add_argument("--games", type=int, default=BENCH_GAMES)
+    parser.add_argument("--repeat", type=int, default=BENCH_REPEAT)
+    parser.add_argument("--threshold", type=float, default=BENCH_THRESHOLD, help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+    cur = _load(args.current) if args.current else run_bench(tuple(args.only), args.positions, args.games, args.repeat)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(cur, f, indent=2)
+        print("wrote '%s'" % args.out, file=sys.stderr)
+    if args.compare:
+        regs = compare(_load(args.compare), cur, args.threshold)
+        print("\n%d regression(s) over %.0f%%" % (len(regs), args.threshold * 100))
+        sys.exit(1 if regs else 0)
+    elif not args.out:
+        json.dump(cur, sys.stdout, indent=2)
+        print()
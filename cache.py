@@ -0,0 +1,117 @@
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import constant
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set
+from agg import GameAgg
+from util import game_run
+from strats import STRATEGIES
+from constant import SIM_CACHE_DIR, SIM_CACHE_MAX_BYTES
+
+RULE_CONSTANTS = (
+    "NUM_DICE", "NUM_SIDES", "NUM_ROLLS", "NUM_TURNS",
+    "UPPER_SECTION_BONUS_THRESHOLD", "UPPER_SECTION_BONUS_SCORE",
+    "FULL_HOUSE_SCORE", "SMALL_STRAIGHT_SCORE", "LARGE_STRAIGHT_SCORE", "YAHTZEE_SCORE",
+    "CATEGORIES", "VALUES"
+)
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_settings: Dict[str, Any] = {"enabled": True, "max_bytes": SIM_CACHE_MAX_BYTES, "dir": SIM_CACHE_DIR}
+
+def configure(enabled: Optional[bool] = None, max_bytes: Optional[int] = None,
+              path: Optional[str] = None) -> None:
+    for k, v in (("enabled", enabled), ("max_bytes", max_bytes), ("dir", path)):
+        if v is not None:
+            _settings[k] = v
+
+def enabled() -> bool:
+    return _settings["enabled"]
+
+def _is_local(obj: Any) -> bool:
+    try:
+        return os.path.dirname(os.path.abspath(inspect.getfile(obj))) == _ROOT
+    except TypeError:
+        return False
+
+def _sources(obj: Any, seen: Set[int], out: List[str]) -> None:
+    obj = inspect.unwrap(obj) if inspect.isfunction(obj) else obj
+    if id(obj) in seen or not _is_local(obj):
+        return
+    seen.add(id(obj))
+    out.append(inspect.getsource(obj))
+    if hasattr(obj, "params"):
+        out.append(repr(obj.params))
+        _sources(obj.base, seen, out)
+    funcs = [v for v in vars(obj).values() if inspect.isfunction(v)] if inspect.isclass(obj) else [obj]
+    for f in funcs:
+        for name in f.__code__.co_names:
+            dep = f.__globals__.get(name)
+            if inspect.isfunction(dep) or inspect.isclass(dep):
+                _sources(dep, seen, out)
+
+def code_hash(*roots: Callable) -> str:
+    out: List[str] = list()
+    seen: Set[int] = set()
+    for fn in roots:
+        _sources(fn, seen, out)
+    rules = {k: repr(getattr(constant, k)) for k in RULE_CONSTANTS}
+    blob = json.dumps({"src": sorted(out), "rules": rules}, sort_keys=True)
+    return hashlib.sha256(blob.encode()).hexdigest()
+
+def strat_hash(strat_name: str) -> str:
+    strat = STRATEGIES[strat_name]
+    return _strat_hash(strat["reroll"], strat["score"])
+
+@lru_cache(maxsize=None)
+def _strat_hash(reroll: Callable, score: Callable) -> str:
+    return code_hash(game_run, reroll, score)
+
+def run_key(strat_name: str, seed: int, shard_size: int, *roots: Callable, tag: str = "") -> str:
+    blob = "%s:%s:%d:%d:%s" % (strat_hash(strat_name), code_hash(*roots), seed, shard_size, tag)
+    return hashlib.sha256(blob.encode()).hexdigest()[:32]
+
+def _shard_path(key: str, idx: int, n: int) -> str:
+    return os.path.join(_settings["dir"], key, "%06d_%d.pkl" % (idx, n))
+
+def get(key: str, idx: int, n: int, seq: bool = False) -> Optional[GameAgg]:
+    path = _shard_path(key, idx, n)
+    try:
+        with open(path, "rb") as f:
+            agg = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if seq and agg.seq is None:
+        return None
+    os.utime(path)
+    return agg
+
+def put(key: str, idx: int, n: int, agg: GameAgg) -> None:
+    path = _shard_path(key, idx, n)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp, "wb") as f:
+        pickle.dump(agg, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def evict(max_bytes: Optional[int] = None) -> int:
+    limit = _settings["max_bytes"] if max_bytes is None else max_bytes
+    files = list()
+    for root, _, names in os.walk(_settings["dir"]):
+        for name in names:
+            path = os.path.join(root, name)
+            st = os.stat(path)
+            files.append((st.st_mtime, st.st_size, path))
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= limit:
+            break
+        os.remove(path)
+        total -= size
+        removed += 1
+    for root, dirs, names in os.walk(_settings["dir"], topdown=False):
+        if root != _settings["dir"] and not dirs and not names:
+            os.rmdir(root)
+    return removed
@@ -0,0 +1,146 @@
+import argparse
+import sys
+from importlib import import_module
+from typing import List, Optional
+from constant import (
+    DEFAULT_SEED, DEFAULT_WORKERS, DEFAULT_NUM_SIMULATIONS, DEFAULT_HEAD_TO_HEAD_GAMES,
+    DEFAULT_VISUALIZATION_GAMES, DEFAULT_TOURNAMENT_GAMES, DEFAULT_RACE_PRECISION,
+    TUNE_CONFIGS, TUNE_ETA, TUNE_MIN_GAMES, TUNE_FINAL_GAMES
+)
+from strats import STRATEGIES
+
+def common_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="worker processes")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="master seed for reproducible runs")
+    parser.add_argument("--no-cache", action="store_true", help="always re-simulate instead of reusing cached runs")
+    parser.add_argument("--prof", action="store_true", help="print a per-stage timing breakdown (also $YAHTZEE_PROF=1)")
+    parser.add_argument("--prof-strat", default=None, help="also capture a cProfile of this strategy's games")
+    parser.add_argument("--tuned", action="store_true", help="also include the strategies saved by tune.py")
+    return parser
+
+def apply_common(args: argparse.Namespace) -> None:
+    import cache
+    import prof
+    cache.configure(enabled=not args.no_cache)
+    prof.setup(args.prof, args.prof_strat)
+    if args.tuned:
+        from strats import load_tuned
+        load_tuned()
+
+def strat_arg(val: str) -> str:
+    if val not in STRATEGIES:
+        from strats import load_tuned
+        load_tuned(None if val.isdigit() else [val])
+    strats = list(STRATEGIES.keys())
+    if val.isdigit() and 1 <= int(val) <= len(strats):
+        return strats[int(val) - 1]
+    if val not in STRATEGIES:
+        raise argparse.ArgumentTypeError("unknown strategy '%s' (choose from: %s)" % (val, ", ".join(strats)))
+    return val
+
+def _store_strat(args: argparse.Namespace) -> str:
+    if args.store:
+        from store import open_store
+        return open_store(args.store).meta["strategy"]
+    if args.strategy is None:
+        raise SystemExit("a strategy is required unless --store is given")
+    return args.strategy
+
+def _sim(args: argparse.Namespace) -> None:
+    from sim import resume_sim
+    resume_sim(args.games, args.workers, args.seed, args.antithetic, args.resume)
+
+def _h2h(args: argparse.Namespace) -> None:
+    from analyze import head_to_head
+    head_to_head(args.s1, args.s2, args.games, args.workers, args.seed, not args.independent)
+
+def _consist(args: argparse.Namespace) -> None:
+    from analyze import analyze_consist
+    analyze_consist(_store_strat(args), args.games, args.workers, args.seed, args.store)
+
+def _tournament(args: argparse.Namespace) -> None:
+    from analyze import tournament_start, race_tournament
+    if args.race:
+        race_tournament(args.games, args.workers, args.seed, args.precision)
+    else:
+        tournament_start(args.games, args.workers, args.seed)
+
+def _vis(args: argparse.Namespace) -> None:
+    from visualize import vis_strat_perf
+    vis_strat_perf(_store_strat(args), args.games, args.workers, args.seed, args.store)
+
+def _exact(args: argparse.Namespace) -> None:
+    from exact import exact_stats, print_exact
+    for name in args.strategies:
+        print_exact(exact_stats(name, not args.no_dist))
+
+def _tune(args: argparse.Namespace) -> None:
+    from tune import tune
+    tune(args.strategies, args.configs, args.eta, args.min_games, args.final_games, args.seed, args.workers,
+         not args.dry_run)
+
+def build_parser() -> argparse.ArgumentParser:
+    common = common_parser()
+    parser = argparse.ArgumentParser(description="non-interactive yahtzee strategy tools")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("sim", parents=[common], help="simulate every strategy and compare (run_sim)")
+    p.add_argument("--games", type=int, default=DEFAULT_NUM_SIMULATIONS)
+    p.add_argument("--antithetic", action="store_true", help="play games in pairs on mirrored (7 - d) dice (widens intervals for the built-in strategies)")
+    p.add_argument("--resume", action="store_true", help="continue from the checkpoints of an interrupted run")
+    p.set_defaults(func=_sim, mod="sim")
+
+    p = sub.add_parser("h2h", parents=[common], help="head-to-head comparison of two strategies")
+    p.add_argument("s1", type=strat_arg)
+    p.add_argument("s2", type=strat_arg)
+    p.add_argument("--games", type=int, default=DEFAULT_HEAD_TO_HEAD_GAMES)
+    p.add_argument("--independent", action="store_true", help="play on independent dice")
+    p.set_defaults(func=_h2h, mod="analyze")
+
+    p = sub.add_parser("consist", parents=[common], help="consistency analysis of one strategy")
+    p.add_argument("strategy", type=strat_arg, nargs="?")
+    p.add_argument("--games", type=int, default=DEFAULT_VISUALIZATION_GAMES)
+    p.add_argument("--store", default=None, help="analyze a saved result store instead of simulating")
+    p.set_defaults(func=_consist, mod="analyze")
+
+    p = sub.add_parser("tournament", parents=[common], help="round-robin tournament heatmap")
+    p.add_argument("--games", type=int, default=DEFAULT_TOURNAMENT_GAMES)
+    p.add_argument("--race", action="store_true", help="stop pairings once their win rate is resolved")
+    p.add_argument("--precision", type=float, default=DEFAULT_RACE_PRECISION,
+                   help="racing tournament win-rate precision (percentage points)")
+    p.set_defaults(func=_tournament, mod="analyze")
+
+    p = sub.add_parser("vis", parents=[common], help="detailed plots for one strategy")
+    p.add_argument("strategy", type=strat_arg, nargs="?")
+    p.add_argument("--games", type=int, default=DEFAULT_VISUALIZATION_GAMES)
+    p.add_argument("--store", default=None, help="visualize a saved result store instead of simulating")
+    p.set_defaults(func=_vis, mod="visualize")
+
+    p = sub.add_parser("exact", parents=[common], help="exact expected score and distribution (no sampling)")
+    p.add_argument("strategies", type=strat_arg, nargs="+")
+    p.add_argument("--no-dist", action="store_true", help="only compute expectations, not the full distribution")
+    p.set_defaults(func=_exact, mod="exact")
+
+    p = sub.add_parser("tune", parents=[common], help="successive-halving search over a strategy's parameters")
+    p.add_argument("strategies", type=strat_arg, nargs="+")
+    p.add_argument("--configs", type=int, default=TUNE_CONFIGS, help="configurations in the first rung")
+    p.add_argument("--eta", type=int, default=TUNE_ETA, help="keep 1/eta of the configurations per rung")
+    p.add_argument("--min-games", type=int, default=TUNE_MIN_GAMES, help="games per configuration in the first rung")
+    p.add_argument("--final-games", type=int, default=TUNE_FINAL_GAMES,
+                   help="fresh games for the best and default configurations")
+    p.add_argument("--dry-run", action="store_true", help="do not save the result as a strategy")
+    p.set_defaults(func=_tune, mod="tune")
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = build_parser().parse_args(argv)
+    import_module(args.mod)
+    apply_common(args)
+    try:
+        args.func(args)
+    except KeyboardInterrupt:
+        print("\nexiting..")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,239 @@
+import argparse
+import inspect
+import json
+import os
+import time
+import numpy as np
+from itertools import product
+from operator import mul
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from logic import Scorecard, DiceSource, HANDS, NUM_CODES, UPPER_MASK, dice_code_arr, hand_idx_arr, hand_idx
+from strats import STRATEGIES, pad_keep
+from trans import KEEP_ARR, KEEPS_OF
+from cache import strat_hash
+from constant import (
+    NUM_DICE, NUM_SIDES, NUM_ROLLS, NUM_CATEGORIES, ALL_CATEGORIES, CATEGORY_INDEX, CATEGORIES, SECTION_UPPER,
+    UPPER_SECTION_BONUS_THRESHOLD, COMPILED_DIR, COMPILE_MAX_ENTRIES, COMPILE_VERIFY_SAMPLES
+)
+
+NUM_UPPER = len(CATEGORIES[SECTION_UPPER])
+UP_CAP = UPPER_SECTION_BONUS_THRESHOLD
+FULL_MASK = (1 << NUM_CATEGORIES) - 1
+POP = np.array([bin(m).count("1") for m in range(FULL_MASK + 1)], dtype=np.int64)
+_W = [(NUM_SIDES + 1) ** i for i in range(NUM_DICE)]
+ORDERED = list(product(range(1, NUM_SIDES + 1), repeat=NUM_DICE))
+
+def _reach(umask: int) -> List[int]:
+    vals = {0}
+    for c in range(NUM_UPPER):
+        if umask >> c & 1:
+            vals = {min(v + k * (c + 1), UP_CAP) for v in vals for k in range(NUM_DICE + 1)}
+    return sorted(vals)
+
+def _mproj(mask, feats: Tuple[str, ...]):
+    if "avail" in feats:
+        return mask
+    m = mask & UPPER_MASK if "avail_upper" in feats else mask * 0
+    if "filled" in feats:
+        m = m * (NUM_CATEGORIES + 1) + POP[mask]
+    return m
+
+def _mproj_size(feats: Tuple[str, ...]) -> int:
+    if "avail" in feats:
+        return FULL_MASK + 1
+    return (UPPER_MASK + 1 if "avail_upper" in feats else 1) * (NUM_CATEGORIES + 1 if "filled" in feats else 1)
+
+def _rep_masks(feats: Tuple[str, ...]) -> Dict[int, int]:
+    if "avail" in feats:
+        return {m: m for m in range(FULL_MASK)}
+    ups = range(UPPER_MASK + 1) if "avail_upper" in feats else [0]
+    fills = range(NUM_CATEGORIES) if "filled" in feats else [None]
+    res = dict()
+    for u in ups:
+        for f in fills:
+            lower = 0 if f is None else f - POP[u]
+            if lower < 0 or lower > NUM_CATEGORIES - NUM_UPPER:
+                continue
+            mask = u | ((1 << lower) - 1) << NUM_UPPER
+            if mask != FULL_MASK:
+                res[int(_mproj(mask, feats))] = mask
+    return res
+
+def _rep_card(mask: int, up: int) -> Scorecard:
+    card = Scorecard()
+    for c, cat in enumerate(ALL_CATEGORIES):
+        if mask >> c & 1:
+            card.set_score(cat, up if c < NUM_UPPER and up else 0)
+            up = 0 if c < NUM_UPPER else up
+    return card
+
+def _states(feats: Tuple[str, ...]) -> Tuple[np.ndarray, List[Scorecard]]:
+    if "upper" in feats and not {"avail", "avail_upper"} & set(feats):
+        raise ValueError("reading 'upper' needs 'avail' or 'avail_upper' to enumerate reachable subtotals")
+    state_of = np.full((_mproj_size(feats), UP_CAP + 1 if "upper" in feats else 1), -1, dtype=np.int32)
+    cards = list()
+    for m, mask in _rep_masks(feats).items():
+        for up in (_reach(mask & UPPER_MASK) if "upper" in feats else [0]):
+            state_of[m, up] = len(cards)
+            cards.append(_rep_card(mask, up))
+    return state_of, cards
+
+def _spec(fn: Callable) -> Dict[str, Any]:
+    feats = getattr(fn, "reads", None)
+    if feats is None:
+        raise ValueError("%s does not declare the state it reads" % fn.__name__)
+    return {"reads": list(feats), "order_free": fn.order_free, "rolls_left": bool(getattr(fn, "rolls_left", False))}
+
+def build(fn: Callable, kind: str) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+    fn = inspect.unwrap(fn)
+    spec = _spec(fn)
+    feats = tuple(spec["reads"])
+    state_of, cards = _states(feats)
+    lefts = [(l,) for l in range(1, NUM_ROLLS)] if kind == "reroll" and spec["rolls_left"] else [()]
+    hands = HANDS if spec["order_free"] else ORDERED
+    n_hand = len(HANDS) if spec["order_free"] else NUM_CODES
+    if len(cards) * len(lefts) * len(hands) > COMPILE_MAX_ENTRIES:
+        raise ValueError("%s has %d decision states, more than COMPILE_MAX_ENTRIES (%d)"
+                         % (fn.__name__, len(cards) * len(lefts) * len(hands), COMPILE_MAX_ENTRIES))
+    idxs = np.arange(len(HANDS)) if spec["order_free"] else dice_code_arr(np.array(ORDERED))
+    if kind == "reroll":
+        table = np.zeros((len(cards), len(lefts), n_hand), dtype=np.uint16)
+        enc = lambda keep: sum(map(mul, pad_keep(keep), _W))
+    else:
+        table = np.zeros((len(cards), 1, n_hand), dtype=np.uint8)
+        enc = CATEGORY_INDEX.__getitem__
+    for s, card in enumerate(cards):
+        if not card.get_avail_cats():
+            continue
+        for l, left in enumerate(lefts):
+            table[s, l, idxs] = [enc(fn(list(h), card, *left)) for h in hands]
+    return table, state_of, spec
+
+def _prefix(strat_name: str, kind: str) -> str:
+    slug = strat_name.replace(" ", "_")
+    return os.path.join(COMPILED_DIR, "%s-%s.%s" % (slug, strat_hash(strat_name)[:12], kind))
+
+def _save(path: str, arr: np.ndarray) -> None:
+    tmp = path + ".tmp.npy"
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+def load(strat_name: str, kind: str, build_missing: bool = True) -> Optional[Tuple[np.ndarray, np.ndarray, Dict[str, Any]]]:
+    prefix = _prefix(strat_name, kind)
+    if not os.path.exists(prefix + ".json"):
+        if not build_missing:
+            return None
+        table, state_of, spec = build(STRATEGIES[strat_name][kind], kind)
+        os.makedirs(COMPILED_DIR, exist_ok=True)
+        _save(prefix + ".table.npy", table)
+        _save(prefix + ".states.npy", state_of)
+        with open(prefix + ".json.tmp", "w") as f:
+            json.dump(dict(spec, strategy=strat_name, kind=kind), f)
+        os.replace(prefix + ".json.tmp", prefix + ".json")
+    with open(prefix + ".json") as f:
+        spec = json.load(f)
+    return np.load(prefix + ".table.npy", mmap_mode="r"), np.load(prefix + ".states.npy", mmap_mode="r"), spec
+
+def lookups(fn: Callable, table: np.ndarray, state_of: np.ndarray, spec: Dict[str, Any],
+            kind: str) -> Tuple[Callable, Callable]:
+    feats = tuple(spec["reads"])
+    upper = "upper" in feats
+    has_left = kind == "reroll" and spec["rolls_left"]
+    hidx = hand_idx if spec["order_free"] else (lambda dice: sum(map(mul, dice, _W)))
+
+    def state(card: Scorecard) -> int:
+        return state_of[_mproj(card.mask, feats), min(card.upper, UP_CAP) if upper else 0]
+
+    def state_arr(card) -> np.ndarray:
+        mask = card.mask()
+        return state_of[_mproj(mask, feats), np.minimum(card.upper(), UP_CAP) if upper else 0]
+
+    hidx_arr = hand_idx_arr if spec["order_free"] else dice_code_arr
+    if kind == "reroll":
+        def scalar(dice: List[int], card: Scorecard, left: int = 1) -> List[int]:
+            return list(KEEPS_OF[table[state(card), left - 1 if has_left else 0, hidx(dice)]])
+
+        def batch(dice: np.ndarray, card, left: int = 1) -> np.ndarray:
+            return KEEP_ARR[table[state_arr(card), left - 1 if has_left else 0, hidx_arr(dice)]]
+    else:
+        def scalar(dice: List[int], card: Scorecard) -> str:
+            return ALL_CATEGORIES[table[state(card), 0, hidx(dice)]]
+
+        def batch(dice: np.ndarray, card) -> np.ndarray:
+            return table[state_arr(card), 0, hidx_arr(dice)].astype(np.int8)
+    for f in (scalar, batch):
+        f.rolls_left = has_left
+        f.__wrapped__ = inspect.unwrap(fn)
+    return scalar, batch
+
+def compiled_strategy(strat_name: str, build_missing: bool = True) -> Dict[str, Callable]:
+    res = dict()
+    for kind in ("reroll", "score"):
+        try:
+            loaded = load(strat_name, kind, build_missing)
+        except ValueError as e:
+            print("not compiling %s %s: %s" % (strat_name, kind, e))
+            continue
+        if loaded:
+            res[kind], res["batch_" + kind] = lookups(STRATEGIES[strat_name][kind], *loaded, kind)
+    return res
+
+def install(strat_name: str, build_missing: bool = True) -> Dict[str, Callable]:
+    res = compiled_strategy(strat_name, build_missing)
+    STRATEGIES[strat_name].update(res)
+    return res
+
+def _sample_states(n: int, seed: int) -> List[Tuple[List[int], Scorecard, int]]:
+    rng = np.random.default_rng(seed)
+    res = list()
+    for mask in rng.integers(0, FULL_MASK, n).tolist():
+        card = Scorecard()
+        for c, cat in enumerate(ALL_CATEGORIES):
+            if mask >> c & 1:
+                card.rec_score(cat, rng.integers(1, NUM_SIDES + 1, NUM_DICE).tolist())
+        res.append((rng.integers(1, NUM_SIDES + 1, NUM_DICE).tolist(), card, int(rng.integers(1, NUM_ROLLS))))
+    return res
+
+def verify(strat_name: str, comp: Dict[str, Callable], n: int = COMPILE_VERIFY_SAMPLES, seed: int = 0) -> Dict[str, int]:
+    bad = dict()
+    samples = _sample_states(n, seed)
+    for kind in ("reroll", "score"):
+        if kind not in comp:
+            continue
+        raw = inspect.unwrap(STRATEGIES[strat_name][kind])
+        order_free = raw.order_free
+        left = kind == "reroll" and getattr(raw, "rolls_left", False)
+        bad[kind] = 0
+        for dice, card, l in samples:
+            args = (l,) if left else ()
+            want, got = raw(list(dice), card, *args), comp[kind](list(dice), card, *args)
+            if kind == "reroll" and order_free:
+                want, got = sorted(want), sorted(got)
+            bad[kind] += want != got
+    return bad
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="compile strategies into memory-mapped decision tables")
+    parser.add_argument("strategies", nargs="*", default=list(STRATEGIES.keys()))
+    parser.add_argument("--verify", type=int, default=COMPILE_VERIFY_SAMPLES, help="sampled states to check")
+    parser.add_argument("--games", type=int, default=500, help="games used to time compiled vs python play")
+    args = parser.parse_args()
+    from util import game_run
+    for name in args.strategies:
+        orig = dict(STRATEGIES[name])
+        t = time.time()
+        comp = compiled_strategy(name)
+        if not comp:
+            continue
+        sizes = sum(os.path.getsize(p) for p in (_prefix(name, k) + ".table.npy" for k in ("reroll", "score")) if os.path.exists(p))
+        print("%s: compiled %s in %.1fs (%d bytes)" % (name, "/".join(k for k in comp if "_" not in k), time.time() - t, sizes))
+        bad = verify(name, comp, args.verify)
+        print("\tverify on %d sampled states: %s" % (args.verify, ", ".join("%s %d mismatches" % kv for kv in bad.items())))
+        for label, entry in (("python", orig), ("compiled", dict(orig, **comp))):
+            STRATEGIES[name].update(entry)
+            src = DiceSource(0)
+            t = time.time()
+            for _ in range(args.games):
+                game_run(name, src)
+            print("\t%s: %.0f games/sec" % (label, args.games / (time.time() - t)))
+        STRATEGIES[name].update(orig)
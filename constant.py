@@ -12,6 +12,14 @@ DEFAULT_NUM_SIMULATIONS = 10000
 DEFAULT_VISUALIZATION_GAMES = 1000
 DEFAULT_TOURNAMENT_GAMES = 500
 DEFAULT_HEAD_TO_HEAD_GAMES = 1000
+DEFAULT_RACE_PRECISION = 3.0
+DEFAULT_RACE_ROUND = 100
+RACE_Z = 2.576
+CI_Z = 1.96
+DEFAULT_SHARD_SIZE = 1000
+DEFAULT_WORKERS = 1
+DEFAULT_SEED = 0
+DICE_BLOCK = 1 << 14
 FIGURE_WIDTH = 12
 FIGURE_HEIGHT = 8
 LARGE_FIGURE_WIDTH = 14
@@ -21,7 +29,34 @@ DETAILED_FIGURE_HEIGHT = 10
 HIST_BINS = 20
 BAR_WIDTH = 0.2
 RUNNING_AVG_WINDOW = 100
+RUNNING_AVG_STEP = 10
+RUNNING_AVG_BLOCKS = 1024
 OUTPUT_DIR = "output"
+CACHE_DIR = ".cache"
+OPTIMAL_TABLE_FILE = "optimal_values.npy"
+OPTIMAL_STATE_CACHE = 4096
+MEMO_CACHE_SIZE = 1 << 16
+COMPILED_DIR = ".cache/compiled"
+COMPILE_MAX_ENTRIES = 1 << 23
+COMPILE_VERIFY_SAMPLES = 20000
+EXACT_DIR = ".cache/exact"
+SIM_CACHE_DIR = ".cache/sims"
+SIM_CACHE_MAX_BYTES = 256 * 2**20
+RUNS_DIR = "runs"
+CKPT_EXT = ".ckpt"
+CKPT_SECS = 30.0
+PROGRESS_SECS = 1.0
+TUNED_FILE = ".cache/tuned.json"
+TUNE_CONFIGS = 27
+TUNE_ETA = 3
+TUNE_MIN_GAMES = 300
+TUNE_FINAL_GAMES = 20000
+TUNE_SHARD_SIZE = 100
+DIST_PORT = 50507
+DIST_LEASE = 120.0
+DIST_POLL = 0.2
+STORE_EXT = ".ycols"
+STORE_CHUNK = 1 << 16
 COMPARISON_DIR = "output/comparison"
 STRATEGIES_DIR = "output/strategies"
 TOURNAMENT_DIR = "output/tournament"
@@ -62,4 +97,8 @@ CATEGORIES = {
 VALUES = {
     CATEGORY_ACES: 1, CATEGORY_TWOS: 2, CATEGORY_THREES: 3, 
     CATEGORY_FOURS: 4, CATEGORY_FIVES: 5, CATEGORY_SIXES: 6
-}
\ No newline at end of file
+}
+
+ALL_CATEGORIES = CATEGORIES[SECTION_UPPER] + CATEGORIES[SECTION_LOWER]
+NUM_CATEGORIES = len(ALL_CATEGORIES)
+CATEGORY_INDEX = {cat: i for i, cat in enumerate(ALL_CATEGORIES)}
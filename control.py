@@ -0,0 +1,48 @@
+import numpy as np
+from functools import lru_cache
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+from logic import HANDS, SCORE_TABLE, hand_idx
+from trans import KEEPS, KEEP_IDX, keep_ev, best_val
+from constant import NUM_DICE, NUM_SIDES, NUM_ROLLS, CATEGORY_INDEX, CATEGORY_YAHTZEE
+
+CONTROLS: Dict[str, np.ndarray] = {
+    "ytz": (SCORE_TABLE[:, CATEGORY_INDEX[CATEGORY_YAHTZEE]] > 0).astype(float),
+    "pips": np.array([sum(h) for h in HANDS], dtype=float),
+    "best": SCORE_TABLE.max(axis=1).astype(float),
+    "mean": SCORE_TABLE.mean(axis=1)
+}
+NUM_CONTROLS = len(CONTROLS)
+
+@lru_cache(maxsize=None)
+def _tables() -> Tuple[Dict[tuple, int], Dict[tuple, int], np.ndarray]:
+    hv = [np.stack(list(CONTROLS.values()), axis=1)]
+    kv = list()
+    for _ in range(NUM_ROLLS):
+        ek = keep_ev(hv[-1].T).T
+        kv.append(ek)
+        hv.append(best_val(ek.T).T)
+    hand_val, keep_val = np.array(hv[:NUM_ROLLS]), np.array(kv)
+    hand_row = {d: hand_idx(d) for d in product(range(1, NUM_SIDES + 1), repeat=NUM_DICE)}
+    keep_row = {
+        d: len(hand_val.reshape(-1, NUM_CONTROLS)) + KEEP_IDX[tuple(sorted(d))]
+        for m in range(NUM_DICE + 1) for d in product(range(1, NUM_SIDES + 1), repeat=m)
+    }
+    return hand_row, keep_row, np.concatenate((hand_val.reshape(-1, NUM_CONTROLS), -keep_val.reshape(-1, NUM_CONTROLS)))
+
+def luck(events: List[Tuple[int, List[int], List[int]]]) -> np.ndarray:
+    hand_row, keep_row, tab = _tables()
+    rows = [l * len(HANDS) + hand_row[tuple(h)] for l, _, h in events]
+    rows += [l * len(KEEPS) + keep_row[tuple(k)] for l, k, _ in events]
+    return tab[rows].sum(axis=0)
+
+def estimate(mom: np.ndarray) -> Optional[Dict[str, float]]:
+    k = mom[0, 0]
+    if k <= NUM_CONTROLS + 2:
+        return None
+    mean = mom[0, 1:] / k
+    cov = (mom[1:, 1:] / k - np.outer(mean, mean)) * k / (k - 1)
+    syy, sxy, sxx = cov[0, 0], cov[0, 1:], cov[1:, 1:]
+    beta = np.linalg.pinv(sxx) @ sxy
+    adj_se = float(max(syy - sxy @ beta, 0) / k) ** 0.5
+    return {"se": float(syy / k) ** 0.5, "adj_avg": float(mean[0] - beta @ mean[1:]), "adj_se": adj_se}
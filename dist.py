@@ -0,0 +1,204 @@
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import deque
+from multiprocessing import Process
+from multiprocessing.managers import BaseManager
+from typing import Dict, List, Optional, Set, Tuple
+import cache as sim_cache
+from agg import GameAgg
+from runner import _run_shard, shards, progress_line, run_tag
+from strats import STRATEGIES, strat_ref, resolve
+from cli import common_parser, apply_common, strat_arg
+from constant import (
+    DEFAULT_NUM_SIMULATIONS, DEFAULT_SHARD_SIZE, DIST_PORT, DIST_LEASE, DIST_POLL, PROGRESS_SECS
+)
+
+WAIT = -1
+
+class Board:
+    def __init__(self, units: Dict[int, Tuple], lease: float):
+        self.units = units
+        self.lease = lease
+        self.lock = threading.Lock()
+        self.pending = deque(sorted(units))
+        self.leased: Dict[int, Tuple[float, str]] = dict()
+        self.results: Dict[int, GameAgg] = dict()
+        self.retried = 0
+        self.workers: Dict[str, int] = dict()
+
+    def _expire(self) -> None:
+        now = time.time()
+        for uid, (deadline, worker) in list(self.leased.items()):
+            if deadline < now:
+                del self.leased[uid]
+                self.pending.appendleft(uid)
+                self.retried += 1
+                print("\nunit %d leased to %s timed out, requeued" % (uid, worker), file=sys.stderr)
+
+    def take(self, worker: str) -> Optional[Tuple[int, Tuple, str]]:
+        with self.lock:
+            self._expire()
+            while self.pending and self.pending[0] in self.results:
+                self.pending.popleft()
+            if self.pending:
+                uid = self.pending.popleft()
+                self.leased[uid] = (time.time() + self.lease, worker)
+                return uid, self.units[uid][0], self.units[uid][1]
+            return None if self.finished() else (WAIT, (), "")
+
+    def done(self, uid: int, worker: str, agg: GameAgg) -> None:
+        with self.lock:
+            self.leased.pop(uid, None)
+            if uid not in self.results:
+                self.results[uid] = agg
+                self.workers[worker] = self.workers.get(worker, 0) + 1
+
+    def finished(self) -> bool:
+        return len(self.results) == len(self.units)
+
+class DistManager(BaseManager):
+    pass
+
+def _addr(addr: str) -> Tuple[str, int]:
+    host, _, port = addr.rpartition(":")
+    return host or "127.0.0.1", int(port or DIST_PORT)
+
+def work(addr: str, authkey: bytes, name: Optional[str] = None, connect_timeout: float = 30.0) -> int:
+    name = name or "%s:%d" % (os.uname().nodename, os.getpid())
+    DistManager.register("board")
+    mgr = DistManager(_addr(addr), authkey)
+    deadline = time.time() + connect_timeout
+    while True:
+        try:
+            mgr.connect()
+            break
+        except (ConnectionError, OSError):
+            if time.time() > deadline:
+                raise
+            time.sleep(DIST_POLL)
+    board = mgr.board()
+    n = 0
+    keys: Dict[Tuple, str] = dict()
+    try:
+        while True:
+            unit = board.take(name)
+            if unit is None:
+                break
+            uid, job, key = unit
+            if uid == WAIT:
+                time.sleep(DIST_POLL)
+                continue
+            _, seed, _, _, _, crn, anti, cv = job
+            strat_name = resolve(job[0])
+            run = (strat_name, seed, crn, anti, cv)
+            if run not in keys:
+                keys[run] = _unit_key(job)
+            if keys[run] != key:
+                raise SystemExit("worker %s runs different code for %s, refusing units" % (name, strat_name))
+            board.done(uid, name, _run_shard(job))
+            n += 1
+    except (ConnectionError, EOFError):
+        pass
+    return n
+
+def _unit_key(job: Tuple) -> str:
+    ref, seed, _, _, _, crn, anti, cv = job
+    return sim_cache.run_key(resolve(ref), seed, DEFAULT_SHARD_SIZE, _run_shard, tag=run_tag(crn, anti, cv))
+
+def coordinate(strats: List[str], n_games: int, seed: int, addr: str, authkey: bytes,
+               lease: float = DIST_LEASE, local_workers: int = 0, anti: bool = False) -> Dict[str, GameAgg]:
+    units: Dict[int, Tuple] = dict()
+    owner: Dict[int, Tuple[str, int]] = dict()
+    cached: Dict[int, GameAgg] = dict()
+    use_cache = sim_cache.enabled()
+    for name in strats:
+        ref = strat_ref(name)
+        key = _unit_key((ref, seed, 0, 0, True, False, anti, True))
+        for idx, n in shards(n_games, DEFAULT_SHARD_SIZE):
+            uid = len(owner)
+            owner[uid] = (name, idx)
+            hit = use_cache and sim_cache.get(key, idx, n, True)
+            if hit:
+                cached[uid] = hit
+            else:
+                units[uid] = ((ref, seed, idx, n, True, False, anti, True), key)
+    board = Board(units, lease)
+    DistManager.register("board", callable=lambda: board)
+    mgr = DistManager(_addr(addr), authkey)
+    server = mgr.get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print("coordinator on %s:%d: %d units (%d cached), lease %.0fs"
+          % (*server.address, len(units), len(cached), lease), file=sys.stderr)
+    procs = [Process(target=work, args=("%s:%d" % server.address, authkey, "local-%d" % i)) for i in range(local_workers)]
+    for p in procs:
+        p.start()
+    t0 = time.time()
+    total = sum(job[3] for job, _ in units.values())
+    merged = GameAgg(cv=True)
+    seen: Set[int] = set()
+    while not board.finished():
+        time.sleep(PROGRESS_SECS)
+        for uid in [uid for uid in list(board.results) if uid not in seen]:
+            merged.merge(board.results[uid])
+            seen.add(uid)
+        if merged.n:
+            print("\r" + progress_line("%s on %d workers" % (", ".join(strats), len(board.workers)), merged, total, merged.n / (time.time() - t0)),
+                  end="", file=sys.stderr)
+    print(file=sys.stderr)
+    for p in procs:
+        p.join(DIST_LEASE)
+    if use_cache:
+        for uid, agg in board.results.items():
+            job, key = units[uid]
+            sim_cache.put(key, job[2], job[3], agg)
+        sim_cache.evict()
+    res = {name: GameAgg(cv=True) for name in strats}
+    parts = {**cached, **board.results}
+    for uid in sorted(parts):
+        res[owner[uid][0]].merge(parts[uid])
+    if units:
+        print("units per worker: %s, %d retried" % (", ".join("%s %d" % kv for kv in sorted(board.workers.items())), board.retried),
+              file=sys.stderr)
+    return res
+
+def main(argv: Optional[List[str]] = None) -> None:
+    try:
+        _main(argv)
+    except KeyboardInterrupt:
+        print("\nexiting..", file=sys.stderr)
+
+def _main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="distributed simulation over a coordinator/worker work queue")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve", parents=[common_parser()], help="hand out work units and combine the results")
+    p.add_argument("strategies", type=strat_arg, nargs="*")
+    p.add_argument("--games", type=int, default=DEFAULT_NUM_SIMULATIONS, help="games per strategy")
+    p.add_argument("--bind", default="127.0.0.1:%d" % DIST_PORT,
+                   help="address workers connect to (use 0.0.0.0 to accept remote workers)")
+    p.add_argument("--lease", type=float, default=DIST_LEASE, help="seconds before an unfinished unit is reissued")
+    p.add_argument("--local-workers", type=int, default=0, help="also start this many workers on this host")
+    p.add_argument("--antithetic", action="store_true", help="play games in pairs on mirrored (7 - d) dice (widens intervals for the built-in strategies)")
+    p = sub.add_parser("work", help="run work units from a coordinator until it is done")
+    p.add_argument("connect", help="coordinator host:port")
+    for p in sub.choices.values():
+        p.add_argument("--authkey", default=os.environ.get("YAHTZEE_DIST_KEY"),
+                       help="shared secret (default: $YAHTZEE_DIST_KEY)")
+    args = parser.parse_args(argv)
+    if not args.authkey:
+        parser.error("an --authkey or $YAHTZEE_DIST_KEY is required; keep it secret, it guards pickled traffic")
+    if args.cmd == "work":
+        print("worker finished %d units" % work(args.connect, args.authkey.encode()))
+        return
+    apply_common(args)
+    from sim import res_analyze
+    strats = args.strategies or list(STRATEGIES.keys())
+    res = coordinate(strats, args.games, args.seed, args.bind, args.authkey.encode(), args.lease,
+                     args.local_workers, args.antithetic)
+    for name in strats:
+        res_analyze(res[name], name)
+
+if __name__ == "__main__":
+    main()
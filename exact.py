@@ -0,0 +1,209 @@
+import argparse
+import inspect
+import json
+import os
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple
+from logic import SCORE_TABLE, MAX_SCORE, HANDS, UPPER_MASK, hand_idx_arr
+from trans import KEEP_ARR, CODE_LEN, CODE_KEEP, FULL_CODES, HAND_P, push, push_ordered
+from compiled import FULL_MASK, UP_CAP, NUM_UPPER, POP, load, _mproj, _reach
+from strats import STRATEGIES
+from cache import strat_hash
+from agg import MAX_CAT_SCORE
+from cli import strat_arg
+from constant import (
+    NUM_DICE, NUM_ROLLS, NUM_TURNS, NUM_CATEGORIES, ALL_CATEGORIES, CATEGORY_INDEX,
+    CATEGORY_YAHTZEE, UPPER_SECTION_BONUS_SCORE, EXACT_DIR
+)
+
+YTZ = CATEGORY_INDEX[CATEGORY_YAHTZEE]
+SC_W = MAX_CAT_SCORE + 1
+CODE_HAND = hand_idx_arr(KEEP_ARR[FULL_CODES])
+CAT_MAX = SCORE_TABLE.max(axis=0).astype(np.int64)
+
+class Decider:
+    def __init__(self, strat_name: str, kind: str):
+        self.fn = inspect.unwrap(STRATEGIES[strat_name][kind])
+        self.feats = tuple(getattr(self.fn, "reads", None) or ())
+        self.order_free = getattr(self.fn, "order_free", False)
+        self.left = kind == "reroll" and getattr(self.fn, "rolls_left", False)
+        self.upper = "upper" in self.feats
+        self.per_state = "avail" in self.feats
+        try:
+            self.table, self.state_of, _ = load(strat_name, kind)
+        except ValueError:
+            self.table = None
+            if getattr(self.fn, "hand_table", None) is None:
+                raise ValueError("%s is too large to compile and has no hand_table" % self.fn.__name__)
+
+    def key(self, mask: int, up: int) -> Tuple[int, int]:
+        return int(_mproj(mask, self.feats)), up if self.upper else 0
+
+    def row(self, mask: int, up: int, left: int = 1) -> np.ndarray:
+        if self.table is None:
+            return self.fn.hand_table(mask, up, *((left,) if self.left else ()))
+        return self.table[self.state_of[self.key(mask, up)], left - 1 if self.left else 0]
+
+class Evaluator:
+    def __init__(self, strat_name: str):
+        self.re = Decider(strat_name, "reroll")
+        self.sc = Decider(strat_name, "score")
+        self.ordered = not (self.re.order_free and self.sc.order_free)
+        self.q_cache: Dict[Tuple[int, int], np.ndarray] = dict()
+        if self.ordered:
+            self.hands = FULL_CODES
+            self.hidx = CODE_HAND
+        else:
+            self.hands = np.arange(len(HANDS))
+            self.hidx = self.hands
+
+    def _view(self, dec: Decider, row: np.ndarray) -> np.ndarray:
+        if self.ordered and dec.order_free:
+            return row[CODE_HAND]
+        return row[FULL_CODES] if self.ordered else row
+
+    def _reroll(self, p: np.ndarray, keep: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        stay = CODE_LEN[keep] == NUM_DICE
+        if self.ordered:
+            live = push_ordered(p[~stay], keep[~stay])[FULL_CODES]
+        else:
+            live = push(p[~stay], CODE_KEEP[keep[~stay]])
+        return live, np.where(stay, p, 0)
+
+    def final_hands(self, mask: int, up: int) -> np.ndarray:
+        key = self.re.key(mask, up)
+        q = None if self.re.per_state else self.q_cache.get(key)
+        if q is not None:
+            return q
+        p = np.full(len(self.hands), 1 / len(self.hands)) if self.ordered else HAND_P
+        done = np.zeros_like(p)
+        for left in range(NUM_ROLLS - 1, 0, -1):
+            p, stay = self._reroll(p, self._view(self.re, self.re.row(mask, up, left)))
+            done += stay
+        q = p + done
+        if not self.re.per_state:
+            self.q_cache[key] = q
+        return q
+
+    def weights(self, mask: int, ups: np.ndarray) -> np.ndarray:
+        w = np.zeros((len(ups), NUM_CATEGORIES * SC_W))
+        per_up = self.re.upper or self.sc.upper
+        for i, up in enumerate(ups.tolist() if per_up else ups[:1].tolist()):
+            cats = self._view(self.sc, self.sc.row(mask, up)).astype(np.int64)
+            w[i] = np.bincount(cats * SC_W + SCORE_TABLE[self.hidx, cats], self.final_hands(mask, up), len(w[i]))
+        if not per_up:
+            w[1:] = w[0]
+        return w.reshape(len(ups), NUM_CATEGORIES, SC_W)
+
+def evaluate(strat_name: str, dist: bool = True, verbose: bool = False) -> Dict[str, Any]:
+    t = time.time()
+    ev = Evaluator(strat_name)
+    ups_of = {u: np.array(_reach(u)) for u in range(UPPER_MASK + 1)}
+    rows_of = dict()
+    for u, ups in ups_of.items():
+        rows_of[u] = np.full(UP_CAP + 1, -1)
+        rows_of[u][ups] = np.arange(len(ups))
+    width = lambda mask: int(CAT_MAX[[c for c in range(NUM_CATEGORIES) if mask >> c & 1]].sum()) + 1 if dist else 1
+    mass = {0: np.ones((1, 1))}
+    cat_avg = np.zeros(NUM_CATEGORIES)
+    turn_p = np.zeros((NUM_TURNS, NUM_CATEGORIES))
+    ytz = 0.0
+    states = 0
+    for mask in sorted(range(FULL_MASK), key=lambda m: (POP[m], m)):
+        turn = POP[mask]
+        if verbose and turn and mask == (1 << turn) - 1:
+            print("\tturn %d: %d card states so far, %.1fs" % (turn, states, time.time() - t))
+        cur = mass.pop(mask, None)
+        if cur is None:
+            continue
+        ups = ups_of[mask & UPPER_MASK]
+        live = cur.sum(axis=1)
+        keep = live > 0
+        if not keep.all():
+            ups, cur, live = ups[keep], cur[keep], live[keep]
+        states += len(ups)
+        w = ev.weights(mask, ups)
+        for c, sc in zip(*np.nonzero(w.any(axis=0))):
+            p = w[:, c, sc]
+            pl = float(p @ live)
+            turn_p[turn, c] += pl
+            cat_avg[c] += sc * pl
+            if c == YTZ and sc:
+                ytz += pl
+            nxt = mask | 1 << c
+            tgt = mass.get(nxt)
+            if tgt is None:
+                tgt = mass[nxt] = np.zeros((len(ups_of[nxt & UPPER_MASK]), width(nxt)))
+            off = sc if dist else 0
+            if c < NUM_UPPER:
+                rows = rows_of[nxt & UPPER_MASK][np.minimum(ups + sc, UP_CAP)]
+                np.add.at(tgt[:, off:off + cur.shape[1]], rows, cur * p[:, None])
+            else:
+                rows = rows_of[nxt & UPPER_MASK][ups]
+                tgt[rows, off:off + cur.shape[1]] += cur * p[:, None]
+    end = mass.pop(FULL_MASK)
+    bonus_rows = ups_of[UPPER_MASK] >= UP_CAP
+    bonus = float(end[bonus_rows].sum())
+    avg = float(cat_avg.sum() + UPPER_SECTION_BONUS_SCORE * bonus)
+    res = {
+        "strategy": strat_name, "avg": avg, "bonus_pct": bonus * 100, "ytz_pct": ytz * 100,
+        "cat_avg": {cat: float(cat_avg[i]) for i, cat in enumerate(ALL_CATEGORIES)},
+        "turn_p": turn_p.tolist(), "states": states, "secs": time.time() - t, "hist": None
+    }
+    if dist:
+        hist = np.zeros(MAX_SCORE + 1)
+        hist[:end.shape[1]] += end[~bonus_rows].sum(axis=0)
+        hist[UPPER_SECTION_BONUS_SCORE:UPPER_SECTION_BONUS_SCORE + end.shape[1]] += end[bonus_rows].sum(axis=0)
+        res.update(dist_stats(hist))
+    return res
+
+def dist_stats(hist: np.ndarray) -> Dict[str, Any]:
+    x = np.arange(len(hist))
+    avg = float(hist @ x)
+    cum = np.cumsum(hist)
+    nz = np.flatnonzero(hist)
+    return {
+        "hist": hist.tolist(), "std": float(np.sqrt(max(hist @ x**2 - avg**2, 0))),
+        "med": int(np.searchsorted(cum, 0.5)), "min": int(nz[0]), "max": int(nz[-1])
+    }
+
+def _path(strat_name: str) -> str:
+    return os.path.join(EXACT_DIR, "%s-%s.json" % (strat_name.replace(" ", "_"), strat_hash(strat_name)[:12]))
+
+def exact_stats(strat_name: str, dist: bool = True, verbose: bool = False) -> Dict[str, Any]:
+    path = _path(strat_name)
+    if os.path.exists(path):
+        with open(path) as f:
+            res = json.load(f)
+        if res["hist"] is not None or not dist:
+            return res
+    res = evaluate(strat_name, dist, verbose)
+    os.makedirs(EXACT_DIR, exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(res, f)
+    os.replace(path + ".tmp", path)
+    return res
+
+def print_exact(res: Dict[str, Any]) -> None:
+    print("\n%s (exact, %d card states, %.1fs):" % (res["strategy"], res["states"], res["secs"]))
+    print("expected score: %.3f" % res["avg"])
+    if res["hist"] is not None:
+        print("standard deviation: %.2f" % res["std"])
+        print("median score: %d" % res["med"])
+    print("upper section bonus rate: %.2f%%" % res["bonus_pct"])
+    print("yahtzee success rate: %.2f%%" % res["ytz_pct"])
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="exact expected score and score distribution of strategies")
+    parser.add_argument("strategies", nargs="*", type=strat_arg, default=list(STRATEGIES.keys()))
+    parser.add_argument("--no-dist", action="store_true", help="only compute expectations, not the full distribution")
+    args = parser.parse_args(argv)
+    for name in args.strategies:
+        try:
+            print_exact(exact_stats(name, not args.no_dist, verbose=True))
+        except ValueError as e:
+            print("\n%s: not evaluated exactly (%s)" % (name, e))
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,87 @@
-import random
+import numpy as np
 from collections import Counter
-from typing import List, Dict, Optional
+from collections.abc import Mapping
+from itertools import combinations_with_replacement
+from typing import List, Dict, Optional, Tuple, Iterator
 from constant import (
-    CATEGORIES, VALUES, NUM_SIDES,
+    CATEGORIES, VALUES, NUM_SIDES, NUM_DICE, ALL_CATEGORIES, CATEGORY_INDEX,
     UPPER_SECTION_BONUS_THRESHOLD, UPPER_SECTION_BONUS_SCORE,
     FULL_HOUSE_SCORE, SMALL_STRAIGHT_SCORE, LARGE_STRAIGHT_SCORE, YAHTZEE_SCORE,
-    SECTION_UPPER, SECTION_LOWER, CATEGORY_THREE_OF_A_KIND, CATEGORY_FOUR_OF_A_KIND,
+    SECTION_UPPER, CATEGORY_THREE_OF_A_KIND, CATEGORY_FOUR_OF_A_KIND,
     CATEGORY_FULL_HOUSE, CATEGORY_SMALL_STRAIGHT, CATEGORY_LARGE_STRAIGHT,
-    CATEGORY_YAHTZEE, CATEGORY_CHANCE
+    CATEGORY_YAHTZEE, CATEGORY_CHANCE, DICE_BLOCK, NUM_ROLLS
 )
 
-def roll(n: int) -> List[int]:
-    return [
-        random.randint(1, NUM_SIDES) for _ in range(n)
-    ]
+class DiceSource:
+    def __init__(self, seed=None, block: int = DICE_BLOCK, bitgen: Optional[np.random.BitGenerator] = None,
+                 anti: bool = False):
+        self.seed_seq = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.bitgen = bitgen or np.random.PCG64(self.seed_seq)
+        self.rng = np.random.Generator(self.bitgen)
+        self.block = block
+        self.anti = anti
+        self.buf: List[int] = list()
+        self.pos = 0
 
-def calc_upper(dice: List[int], val: int) -> int:
+    def _fill(self) -> None:
+        buf = self.rng.integers(1, NUM_SIDES + 1, self.block, dtype=np.int8)
+        self.buf = (NUM_SIDES + 1 - buf if self.anti else buf).tolist()
+        self.pos = 0
+
+    def roll(self, n: int) -> List[int]:
+        if self.pos + n > len(self.buf):
+            self._fill()
+        pos = self.pos
+        self.pos = pos + n
+        return self.buf[pos:self.pos]
+
+    def new_turn(self) -> None:
+        pass
+
+    def spawn(self, n: int) -> List["DiceSource"]:
+        return [type(self)(ss, self.block, anti=self.anti) for ss in self.seed_seq.spawn(n)]
+
+    def jumped(self, jumps: int = 1) -> "DiceSource":
+        return type(self)(self.seed_seq.spawn(1)[0], self.block, self.bitgen.jumped(jumps), self.anti)
+
+    def mirror(self) -> "DiceSource":
+        return type(self)(self.seed_seq, self.block, anti=not self.anti)
+
+class TurnDice(DiceSource):
+    def __init__(self, seed=None, block: int = DICE_BLOCK, bitgen: Optional[np.random.BitGenerator] = None,
+                 anti: bool = False):
+        super().__init__(seed, block - block % (NUM_ROLLS * NUM_DICE), bitgen, anti)
+        self.turn: List[int] = list()
+        self.slot = 0
+
+    def new_turn(self) -> None:
+        self.turn = DiceSource.roll(self, NUM_ROLLS * NUM_DICE)
+        self.slot = 0
+
+    def roll(self, n: int) -> List[int]:
+        pos = self.slot * NUM_DICE
+        if pos + n > len(self.turn) or n > NUM_DICE:
+            raise RuntimeError("TurnDice rolled %d dice in slot %d of a %d-slot turn; call new_turn() first"
+                               % (n, self.slot, len(self.turn) // NUM_DICE))
+        self.slot += 1
+        return self.turn[pos:pos + n]
+
+DEFAULT_DICE = DiceSource()
+
+def roll(n: int, src: Optional[DiceSource] = None) -> List[int]:
+    return (src or DEFAULT_DICE).roll(n)
+
+def dice_source(seed=None, crn: bool = False) -> DiceSource:
+    return TurnDice(seed) if crn else DiceSource(seed)
+
+def sub_seed(seed: Optional[int], *key: int) -> int:
+    ss = np.random.SeedSequence(seed, spawn_key=key)
+    return int(ss.generate_state(1, dtype=np.uint64)[0])
+
+def _calc_upper(dice: List[int], val: int) -> int:
     return dice.count(val)*val
 
-def calc_n_of_kind(dice: List[int], n: int) -> int:
+def _calc_n_of_kind(dice: List[int], n: int) -> int:
     cnts = Counter(dice)
     if any(
         cnt >= n for cnt in cnts.values()
@@ -26,11 +89,11 @@ def calc_n_of_kind(dice: List[int], n: int) -> int:
         return sum(dice)
     return 0
 
-def calc_full_house(dice: List[int]) -> int:
+def _calc_full_house(dice: List[int]) -> int:
     cnts = Counter(dice)
     return FULL_HOUSE_SCORE if sorted(cnts.values()) == [2, 3] else 0
 
-def calc_str(dice: List[int], length: int) -> int:
+def _calc_str(dice: List[int], length: int) -> int:
     uniq = sorted(list(set(dice)))
     if len(uniq) < length:
         return 0
@@ -47,52 +110,163 @@ def calc_str(dice: List[int], length: int) -> int:
     return 0
 
 
-def calc_yahtzee(dice: List[int]) -> int:
+def _calc_yahtzee(dice: List[int]) -> int:
     return YAHTZEE_SCORE if len(set(dice)) == 1 else 0
 
-class Scorecard:    
+def _hand_scores(hand: Tuple[int, ...]) -> List[int]:
+    d = list(hand)
+    return [_calc_upper(d, VALUES[cat]) for cat in CATEGORIES[SECTION_UPPER]] + [
+        _calc_n_of_kind(d, 3),
+        _calc_n_of_kind(d, 4),
+        _calc_full_house(d),
+        _calc_str(d, 4),
+        _calc_str(d, 5),
+        _calc_yahtzee(d),
+        sum(d)
+    ]
+
+HANDS: List[Tuple[int, ...]] = list(combinations_with_replacement(range(1, NUM_SIDES + 1), NUM_DICE))
+HAND_IDX: Dict[Tuple[int, ...], int] = {h: i for i, h in enumerate(HANDS)}
+SCORE_TABLE = np.array([_hand_scores(h) for h in HANDS], dtype=np.uint8)
+SCORE_TABLE.flags.writeable = False
+MAX_SCORE = int(SCORE_TABLE.max(axis=0).sum()) + UPPER_SECTION_BONUS_SCORE
+_ROWS = [tuple(int(sc) for sc in row) for row in SCORE_TABLE]
+_KIND_COL = {3: CATEGORY_INDEX[CATEGORY_THREE_OF_A_KIND], 4: CATEGORY_INDEX[CATEGORY_FOUR_OF_A_KIND]}
+_STR_COL = {4: CATEGORY_INDEX[CATEGORY_SMALL_STRAIGHT], 5: CATEGORY_INDEX[CATEGORY_LARGE_STRAIGHT]}
+_YTZ_COL = CATEGORY_INDEX[CATEGORY_YAHTZEE]
+_FH_COL = CATEGORY_INDEX[CATEGORY_FULL_HOUSE]
+
+HAND_ARR = np.array(HANDS, dtype=np.int8)
+_CODE_W = (NUM_SIDES + 1) ** np.arange(NUM_DICE, dtype=np.int64)
+_CODE_IDX = np.full((NUM_SIDES + 1) ** NUM_DICE, -1, dtype=np.int16)
+_CODE_IDX[HAND_ARR.astype(np.int64) @ _CODE_W] = np.arange(len(HANDS))
+
+NUM_CODES = len(_CODE_IDX)
+
+def dice_code_arr(dice: np.ndarray) -> np.ndarray:
+    return dice.astype(np.int64) @ _CODE_W
+
+def hand_idx_arr(dice: np.ndarray) -> np.ndarray:
+    return _CODE_IDX[dice_code_arr(np.sort(dice, axis=1))]
+
+def hand_idx(dice: List[int]) -> int:
+    return HAND_IDX[tuple(sorted(dice))]
+
+def hand_scores(dice: List[int]) -> Optional[Tuple[int, ...]]:
+    i = HAND_IDX.get(tuple(sorted(dice)))
+    return None if i is None else _ROWS[i]
+
+def calc_upper(dice: List[int], val: int) -> int:
+    row = hand_scores(dice)
+    if row is None or not 1 <= val <= NUM_SIDES:
+        return _calc_upper(dice, val)
+    return row[val - 1]
+
+def calc_n_of_kind(dice: List[int], n: int) -> int:
+    row = hand_scores(dice)
+    if row is None or n not in _KIND_COL:
+        return _calc_n_of_kind(dice, n)
+    return row[_KIND_COL[n]]
+
+def calc_full_house(dice: List[int]) -> int:
+    row = hand_scores(dice)
+    return _calc_full_house(dice) if row is None else row[_FH_COL]
+
+def calc_str(dice: List[int], length: int) -> int:
+    row = hand_scores(dice)
+    if row is None or length not in _STR_COL:
+        return _calc_str(dice, length)
+    return row[_STR_COL[length]]
+
+def calc_yahtzee(dice: List[int]) -> int:
+    row = hand_scores(dice)
+    return _calc_yahtzee(dice) if row is None else row[_YTZ_COL]
+
+def calc_score(cat: str, dice: List[int]) -> int:
+    row = hand_scores(dice)
+    if row is None:
+        return _hand_scores(tuple(dice))[CATEGORY_INDEX[cat]] if cat in CATEGORY_INDEX else 0
+    return row[CATEGORY_INDEX[cat]] if cat in CATEGORY_INDEX else 0
+
+UPPER_MASK = (1 << len(CATEGORIES[SECTION_UPPER])) - 1
+_AVAIL: Dict[int, Tuple[str, ...]] = dict()
+
+class ScoreView(Mapping):
+    __slots__ = ("card",)
+
+    def __init__(self, card: "Scorecard"):
+        self.card = card
+
+    def __getitem__(self, cat: str) -> Optional[int]:
+        return self.card.get_score(cat)
+
+    def __setitem__(self, cat: str, score: int) -> None:
+        self.card.set_score(cat, score)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(ALL_CATEGORIES)
+
+    def __len__(self) -> int:
+        return len(ALL_CATEGORIES)
+
+class Scorecard:
+    __slots__ = ("mask", "vals", "upper", "lower", "filled")
+
     def __init__(self):
-        self.scores: Dict[str, Optional[int]] = {
-            cat: None for sec in CATEGORIES.values() for cat in sec
-        }
+        self.mask = 0
+        self.vals: List[int] = [0] * len(ALL_CATEGORIES)
+        self.upper = 0
+        self.lower = 0
+        self.filled = 0
+
+    @property
+    def scores(self) -> ScoreView:
+        return ScoreView(self)
 
     def is_cat_used(self, cat: str) -> bool:
-        return self.scores[cat] is not None
+        return self.mask >> CATEGORY_INDEX[cat] & 1 == 1
+
+    def get_score(self, cat: str) -> Optional[int]:
+        i = CATEGORY_INDEX[cat]
+        return self.vals[i] if self.mask >> i & 1 else None
+
+    def set_score(self, cat: str, score: int) -> None:
+        i = CATEGORY_INDEX[cat]
+        bit = 1 << i
+        if self.mask & bit:
+            old = self.vals[i]
+        else:
+            old = 0
+            self.mask |= bit
+            self.filled += 1
+        self.vals[i] = score
+        if bit & UPPER_MASK:
+            self.upper += score - old
+        else:
+            self.lower += score - old
 
     def rec_score(self, cat: str, dice: List[int]) -> bool:
         if self.is_cat_used(cat):
             print("warning: category %s already used." % cat)
             return False
 
-        score = {
-            **{k: lambda d, v=v: calc_upper(d, v) for k, v in VALUES.items()},
-            CATEGORY_THREE_OF_A_KIND: lambda d: calc_n_of_kind(d, 3),
-            CATEGORY_FOUR_OF_A_KIND: lambda d: calc_n_of_kind(d, 4),
-            CATEGORY_FULL_HOUSE: calc_full_house,
-            CATEGORY_SMALL_STRAIGHT: lambda d: calc_str(d, 4),
-            CATEGORY_LARGE_STRAIGHT: lambda d: calc_str(d, 5),
-            CATEGORY_YAHTZEE: calc_yahtzee,
-            CATEGORY_CHANCE: sum
-        }.get(cat, lambda d: 0)(dice)
-
-        self.scores[cat] = score
+        self.set_score(cat, calc_score(cat, dice))
         return True
 
     def get_upper(self) -> int:
-        return sum(
-            self.scores[cat] for cat in CATEGORIES[SECTION_UPPER] if self.scores[cat] is not None
-        )
+        return self.upper
+
+    def get_upper_filled(self) -> int:
+        return bin(self.mask & UPPER_MASK).count("1")
 
     def get_total(self) -> int:
-        upper = self.get_upper()
-        bonus = UPPER_SECTION_BONUS_SCORE if upper >= UPPER_SECTION_BONUS_THRESHOLD else 0
-        lower = sum(
-            self.scores[cat] for cat in CATEGORIES[SECTION_LOWER] if self.scores[cat] is not None
-        )
-        return upper + bonus + lower
-
-    def get_avail_cats(self) -> List[str]:
-        return [
-            cat for cat, score in self.scores.items() 
-            if score is None
-        ]
\ No newline at end of file
+        bonus = UPPER_SECTION_BONUS_SCORE if self.upper >= UPPER_SECTION_BONUS_THRESHOLD else 0
+        return self.upper + bonus + self.lower
+
+    def get_avail_cats(self) -> Tuple[str, ...]:
+        avail = _AVAIL.get(self.mask)
+        if avail is None:
+            avail = _AVAIL[self.mask] = tuple(
+                cat for i, cat in enumerate(ALL_CATEGORIES) if not self.mask >> i & 1
+            )
+        return avail
@@ -0,0 +1,94 @@
+import sys
+from functools import wraps
+from operator import attrgetter
+from typing import Callable, Dict, List
+from constant import MEMO_CACHE_SIZE
+from logic import UPPER_MASK
+
+FEATURES: Dict[str, Callable] = {
+    "avail": attrgetter("mask"),
+    "avail_upper": lambda card: card.mask & UPPER_MASK,
+    "filled": attrgetter("filled"),
+    "upper": attrgetter("upper")
+}
+
+class MemoStats:
+    __slots__ = ("name", "hits", "misses", "evictions", "size")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+
+    def as_dict(self) -> Dict[str, object]:
+        calls = self.hits + self.misses
+        return {
+            "name": self.name, "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "size": self.size, "hit_pct": self.hits / calls * 100 if calls else 0.0
+        }
+
+_stats: List[MemoStats] = list()
+
+def reads(*feats: str, order_free: bool = False) -> Callable:
+    for f in feats:
+        if f not in FEATURES:
+            raise ValueError("unknown state feature '%s'" % f)
+    def deco(fn: Callable) -> Callable:
+        fn.reads = feats
+        fn.order_free = order_free
+        return fn
+    return deco
+
+def memoize(fn: Callable, size: int = MEMO_CACHE_SIZE) -> Callable:
+    feats = getattr(fn, "reads", None)
+    if feats is None or size <= 0:
+        return fn
+    getters = [FEATURES[f] for f in feats]
+    if len(getters) == 1:
+        get = getters[0]
+    else:
+        get = lambda card: tuple(g(card) for g in getters)
+    order_free = fn.order_free
+    cache = dict()
+    st = MemoStats(fn.__name__)
+    _stats.append(st)
+
+    @wraps(fn)
+    def memo(dice: List[int], card, *left):
+        hand = tuple(sorted(dice)) if order_free else tuple(dice)
+        key = (hand, get(card), *left)
+        try:
+            res = cache[key]
+            st.hits += 1
+        except KeyError:
+            st.misses += 1
+            res = fn(list(hand), card, *left)
+            if type(res) is list:
+                res = tuple(res)
+            if len(cache) >= size:
+                del cache[next(iter(cache))]
+                st.evictions += 1
+            cache[key] = res
+            st.size = len(cache)
+        return list(res) if type(res) is tuple else res
+
+    memo.cache = cache
+    memo.stats = st
+    return memo
+
+def memoize_strategies(strats: Dict[str, Dict[str, Callable]], size: int = MEMO_CACHE_SIZE) -> None:
+    for strat in strats.values():
+        strat["reroll"] = memoize(strat["reroll"], size)
+        strat["score"] = memoize(strat["score"], size)
+
+def memo_stats() -> List[Dict[str, object]]:
+    return [st.as_dict() for st in _stats if st.hits or st.misses]
+
+def print_memo_stats(out=sys.stderr) -> None:
+    print("\ndecision memo (hit rate / entries)", file=out)
+    print("%-20s %12s %12s %8s %10s %10s" % ("function", "hits", "misses", "hit %", "entries", "evicted"), file=out)
+    for s in memo_stats():
+        print("%-20s %12d %12d %7.2f%% %10d %10d"
+              % (s["name"], s["hits"], s["misses"], s["hit_pct"], s["size"], s["evictions"]), file=out)
@@ -0,0 +1,139 @@
+import os
+import time
+import numpy as np
+from functools import lru_cache
+from typing import List, Tuple
+from logic import Scorecard, HANDS, SCORE_TABLE, hand_idx
+import trans
+from trans import KEEPS, KEEP_CODES, keep_ev, best_val, best_keep
+from constant import (
+    NUM_DICE, NUM_SIDES, NUM_ROLLS, NUM_CATEGORIES, ALL_CATEGORIES, CATEGORIES, SECTION_UPPER,
+    UPPER_SECTION_BONUS_THRESHOLD, UPPER_SECTION_BONUS_SCORE,
+    CACHE_DIR, OPTIMAL_TABLE_FILE, OPTIMAL_STATE_CACHE
+)
+
+NUM_UPPER = len(CATEGORIES[SECTION_UPPER])
+UP_CAP = UPPER_SECTION_BONUS_THRESHOLD
+FULL_MASK = (1 << NUM_CATEGORIES) - 1
+
+def _avail(mask: int) -> List[int]:
+    return [c for c in range(NUM_CATEGORIES) if not mask >> c & 1]
+
+def _final_vals(vals: np.ndarray, mask: int, ups: np.ndarray) -> np.ndarray:
+    best = np.full(np.broadcast_shapes(ups.shape, (len(HANDS),)), -np.inf)
+    for c in _avail(mask):
+        sc = SCORE_TABLE[:, c].astype(np.int64)
+        nxt = vals[mask | 1 << c]
+        if c < NUM_UPPER:
+            tot = ups + sc
+            v = sc + UPPER_SECTION_BONUS_SCORE * ((ups < UP_CAP) & (tot >= UP_CAP)) + nxt[np.minimum(tot, UP_CAP)]
+        else:
+            v = sc + nxt[ups]
+        np.maximum(best, v, out=best)
+    return best
+
+def _reroll_vals(v: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    ek = keep_ev(v)
+    return ek, best_val(ek)
+
+def solve() -> np.ndarray:
+    vals = np.zeros((FULL_MASK + 1, UP_CAP + 1))
+    ups = np.arange(UP_CAP + 1)[:, None]
+    for mask in range(FULL_MASK - 1, -1, -1):
+        v = _final_vals(vals, mask, ups)
+        for __ in range(NUM_ROLLS - 1):
+            v = _reroll_vals(v)[1]
+        vals[mask] = v @ trans.HAND_P
+    return vals.astype(np.float32)
+
+@lru_cache(maxsize=None)
+def values() -> np.ndarray:
+    path = os.path.join(CACHE_DIR, OPTIMAL_TABLE_FILE)
+    if not os.path.exists(path):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, solve())
+        os.replace(tmp, path)
+    return np.load(path, mmap_mode='r')
+
+def _state(card: Scorecard) -> Tuple[int, int]:
+    return card.mask, min(card.upper, UP_CAP)
+
+@lru_cache(maxsize=OPTIMAL_STATE_CACHE)
+def _keep_vals(mask: int, up: int) -> Tuple[np.ndarray, ...]:
+    v = _final_vals(values(), mask, np.int64(up))
+    res = list()
+    for __ in range(NUM_ROLLS - 1):
+        ek, v = _reroll_vals(v)
+        res.append(ek)
+    return tuple(res)
+
+def opt_re(dice: List[int], card: Scorecard, rolls_left: int) -> List[int]:
+    ek = _keep_vals(*_state(card))[rolls_left - 1]
+    best = max(trans.HAND_SUBS[hand_idx(dice)], key=ek.__getitem__)
+    return list(KEEPS[best])
+
+def opt_re_table(mask: int, up: int, rolls_left: int) -> np.ndarray:
+    return KEEP_CODES[best_keep(_keep_vals(mask, up)[rolls_left - 1])]
+
+opt_re.rolls_left = True
+opt_re.reads = ("avail", "upper")
+opt_re.order_free = True
+opt_re.hand_table = opt_re_table
+
+def opt_turn(dice: List[int], card: Scorecard) -> str:
+    mask, up = _state(card)
+    h = hand_idx(dice)
+    best = max(_avail(mask), key=lambda c: _cat_val(values(), mask, up, h, c))
+    return ALL_CATEGORIES[best]
+
+def opt_turn_table(mask: int, up: int) -> np.ndarray:
+    vals = values()
+    best = np.full(len(HANDS), -np.inf, dtype=np.float32)
+    res = np.zeros(len(HANDS), dtype=np.int64)
+    for c in _avail(mask):
+        sc = SCORE_TABLE[:, c].astype(np.int64)
+        if c < NUM_UPPER:
+            v = (sc + UPPER_SECTION_BONUS_SCORE * ((up < UP_CAP) & (up + sc >= UP_CAP))).astype(np.float32)
+            v += vals[mask | 1 << c][np.minimum(up + sc, UP_CAP)]
+        else:
+            v = sc.astype(np.float32) + vals[mask | 1 << c, up]
+        better = v > best
+        res[better] = c
+        best[better] = v[better]
+    return res
+
+opt_turn.reads = ("avail", "upper")
+opt_turn.order_free = True
+opt_turn.hand_table = opt_turn_table
+
+def _cat_val(vals: np.ndarray, mask: int, up: int, h: int, c: int) -> float:
+    sc = int(SCORE_TABLE[h, c])
+    if c >= NUM_UPPER:
+        return sc + vals[mask | 1 << c, up]
+    bonus = UPPER_SECTION_BONUS_SCORE if up < UP_CAP <= up + sc else 0
+    return sc + bonus + vals[mask | 1 << c, min(up + sc, UP_CAP)]
+
+if __name__ == "__main__":
+    path = os.path.join(CACHE_DIR, OPTIMAL_TABLE_FILE)
+    t = time.time()
+    vals = values()
+    print("value table ready in %.2fs (%s, %d bytes)" % (time.time() - t, path, os.path.getsize(path)))
+    print("expected score under optimal play: %.2f" % vals[0, 0])
+    rng = np.random.default_rng(0)
+    n = 1000
+    cards = list()
+    for mask in rng.integers(0, FULL_MASK, n).tolist():
+        card = Scorecard()
+        for c, cat in enumerate(ALL_CATEGORIES):
+            if mask >> c & 1:
+                card.set_score(cat, int(rng.integers(0, 4)) * (c + 1 if c < NUM_UPPER else 1))
+        cards.append(card)
+    hands = rng.integers(1, NUM_SIDES + 1, (n, NUM_DICE)).tolist()
+    for label in ("cold", "warm"):
+        t = time.time()
+        for dice, card in zip(hands, cards):
+            opt_re(dice, card, 2)
+            opt_re(dice, card, 1)
+            opt_turn(dice, card)
+        print("%s decision latency: %.1f us" % (label, (time.time() - t) / (3 * n) * 1e6))
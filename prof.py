@@ -0,0 +1,129 @@
+import atexit
+import cProfile
+import os
+import pstats
+import sys
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROF_ENV = "YAHTZEE_PROF"
+PROF_STRAT_ENV = "YAHTZEE_PROF_STRAT"
+PROF_OUT = "prof.pstats"
+PROF_TOP = 25
+GAME_STAGES = ("game", "turn_init", "reroll", "roll", "score", "rec_score")
+POST_STAGES = (
+    ("runner", "run_games"), ("sim", "res_analyze"), ("util", "calc_stats"), ("util", "calc_cat_stats"),
+    ("sim", "plot_dist"), ("sim", "plot_comp")
+)
+NO_STRAT = "-"
+
+_ROOT = os.path.dirname(os.path.abspath(__file__))
+_stats: Dict[Tuple[str, str], List[int]] = dict()
+_state: Dict[str, Any] = {"on": False, "strat": NO_STRAT, "target": None, "profile": None}
+
+def active() -> bool:
+    return _state["on"]
+
+def _add(strat: str, stage: str, ns: int) -> None:
+    cell = _stats.get((strat, stage))
+    if cell is None:
+        cell = _stats[(strat, stage)] = [0, 0]
+    cell[0] += 1
+    cell[1] += ns
+
+def _timed(fn: Callable, stage: str, strat: Optional[str] = None) -> Callable:
+    @wraps(fn)
+    def run(*args, **kw):
+        t = time.perf_counter_ns()
+        try:
+            return fn(*args, **kw)
+        finally:
+            _add(strat or _state["strat"], stage, time.perf_counter_ns() - t)
+    return run
+
+def _game(fn: Callable) -> Callable:
+    timed = _timed(fn, "game")
+
+    @wraps(fn)
+    def run(strat_name: str, *args, **kw):
+        prev = _state["strat"]
+        _state["strat"] = strat_name
+        prof = _state["profile"] if strat_name == _state["target"] else None
+        if prof:
+            prof.enable()
+        try:
+            return timed(strat_name, *args, **kw)
+        finally:
+            if prof:
+                prof.disable()
+            _state["strat"] = prev
+    return run
+
+def _patch(orig: Callable, new: Callable) -> None:
+    for mod in list(sys.modules.values()):
+        if os.path.dirname(os.path.abspath(getattr(mod, "__file__", None) or "/")) != _ROOT:
+            continue
+        for name, val in list(vars(mod).items()):
+            if val is orig:
+                setattr(mod, name, new)
+
+def _module(name: str) -> Any:
+    main = sys.modules.get("__main__")
+    if os.path.basename(getattr(main, "__file__", None) or "") == name + ".py":
+        return main
+    return sys.modules.get(name)
+
+def install(target: Optional[str] = None) -> None:
+    if _state["on"]:
+        return
+    import cache
+    import logic
+    import util
+    import runner
+    from strats import STRATEGIES
+    _state["on"] = True
+    _state["target"] = target
+    _state["profile"] = cProfile.Profile() if target else None
+    cache.configure(enabled=False)
+    _patch(util.game_run, _game(util.game_run))
+    _patch(util.turn_init, _timed(util.turn_init, "turn_init"))
+    _patch(logic.roll, _timed(logic.roll, "roll"))
+    logic.Scorecard.rec_score = _timed(logic.Scorecard.rec_score, "rec_score")
+    for name, strat in STRATEGIES.items():
+        strat["reroll"] = _timed(strat["reroll"], "reroll", name)
+        strat["score"] = _timed(strat["score"], "score", name)
+    for mod, name in POST_STAGES:
+        fn = getattr(_module(mod), name, None)
+        if fn is not None:
+            _patch(fn, _timed(fn, name, NO_STRAT))
+
+def report(out=sys.stderr) -> None:
+    strats = sorted({s for s, _ in _stats if s != NO_STRAT})
+    print("\ninstrumentation breakdown (nested stages are included in their parents)", file=out)
+    print("%-24s %-16s %10s %12s %10s %8s" % ("strategy", "stage", "calls", "total ms", "us/call", "% game"), file=out)
+    for s in strats:
+        game_ns = _stats.get((s, "game"), [0, 0])[1] or 1
+        for stage in GAME_STAGES:
+            if (s, stage) in _stats:
+                calls, ns = _stats[(s, stage)]
+                print("%-24s %-16s %10d %12.1f %10.2f %7.1f%%"
+                      % (s, stage, calls, ns / 1e6, ns / calls / 1e3, ns / game_ns * 100), file=out)
+    for _, stage in POST_STAGES:
+        if (NO_STRAT, stage) in _stats:
+            calls, ns = _stats[(NO_STRAT, stage)]
+            print("%-24s %-16s %10d %12.1f %10.2f %8s" % (NO_STRAT, stage, calls, ns / 1e6, ns / calls / 1e3, ""), file=out)
+    from memo import print_memo_stats
+    print_memo_stats(out)
+    prof = _state["profile"]
+    if prof and prof.getstats():
+        prof.dump_stats(PROF_OUT)
+        print("\ncProfile for %s saved as '%s'" % (_state["target"], PROF_OUT), file=out)
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(PROF_TOP)
+
+def setup(flag: bool = False, target: Optional[str] = None) -> bool:
+    target = target or os.environ.get(PROF_STRAT_ENV) or None
+    if flag or target or os.environ.get(PROF_ENV, "") not in ("", "0"):
+        install(target)
+        atexit.register(report)
+    return _state["on"]
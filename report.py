@@ -0,0 +1,64 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from constant import DEFAULT_NUM_SIMULATIONS, DEFAULT_WORKERS
+from strats import STRATEGIES
+from util import calc_stats
+from runner import run_games
+from sim import plot_dist, plot_comp
+from analyze import tournament_matrix, plot_tournament
+from visualize import strat_perf_data, plot_strat_perf
+from cli import common_parser, apply_common
+
+def _headless() -> None:
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _render(job: Tuple[Callable, Tuple, Dict[str, Any]]) -> Any:
+    fn, args, kw = job
+    return fn(*args, **kw)
+
+def report_jobs(aggs: Dict[str, Any]) -> List[Tuple[Callable, Tuple, Dict[str, Any]]]:
+    stats = {name: calc_stats(agg) for name, agg in aggs.items()}
+    strats = list(aggs.keys())
+    jobs = [
+        (plot_dist, (stats,), {}),
+        (plot_comp, (stats,), {}),
+        (plot_tournament, (strats, tournament_matrix(strats, list(aggs.values()), verbose=False)), {}),
+    ]
+    jobs += [(plot_strat_perf, (), strat_perf_data(name, agg)) for name, agg in aggs.items()]
+    return jobs
+
+def build_report(n_games: int = DEFAULT_NUM_SIMULATIONS, workers: int = DEFAULT_WORKERS,
+                 seed: Optional[int] = None, plot_workers: Optional[int] = None) -> List[str]:
+    t = time.time()
+    aggs = dict()
+    for name in STRATEGIES:
+        print("simulating %s strategy.." % name)
+        aggs[name] = run_games(name, n_games, seed, workers)
+    jobs = report_jobs(aggs)
+    print("simulated %d strategies in %.1fs, rendering %d figures.." % (len(aggs), time.time() - t, len(jobs)))
+    t = time.time()
+    plot_workers = plot_workers or os.cpu_count() or 1
+    if plot_workers <= 1:
+        _headless()
+        outs = list(map(_render, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(plot_workers, len(jobs)), initializer=_headless) as ex:
+            outs = list(ex.map(_render, jobs))
+    print("rendered in %.1fs" % (time.time() - t))
+    return outs
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="simulate every strategy once and render all report figures",
+                                     parents=[common_parser()])
+    parser.add_argument("--games", type=int, default=DEFAULT_NUM_SIMULATIONS)
+    parser.add_argument("--plot-workers", type=int, default=None, help="processes used to render figures (default: cpu count)")
+    args = parser.parse_args(argv)
+    apply_common(args)
+    build_report(args.games, args.workers, args.seed, args.plot_workers)
+
+if __name__ == "__main__":
+    main()
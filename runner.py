@@ -0,0 +1,149 @@
+import os
+import pickle
+import signal
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import cache as sim_cache
+import prof
+from agg import GameAgg
+from util import game_run
+from control import estimate
+from logic import dice_source, sub_seed
+from strats import StratRef, strat_ref, resolve
+from constant import DEFAULT_SHARD_SIZE, DEFAULT_WORKERS, RUNS_DIR, CKPT_EXT, CKPT_SECS, PROGRESS_SECS, CI_Z
+
+def _run_shard(args: Tuple[StratRef, int, int, int, bool, bool, bool, bool]) -> GameAgg:
+    ref, seed, idx, n, seq, crn, anti, cv = args
+    strat_name = resolve(ref)
+    src = dice_source(sub_seed(seed, idx), crn or anti)
+    agg = GameAgg(seq, cv)
+    if anti:
+        mir = src.mirror()
+        for _ in range(n // 2):
+            agg.add_pair(game_run(strat_name, src, cv), game_run(strat_name, mir, cv))
+        if n % 2:
+            agg.add(game_run(strat_name, src, cv), False)
+        return agg
+    for _ in range(n):
+        agg.add(game_run(strat_name, src, cv))
+    return agg
+
+def shards(n_games: int, shard_size: int = DEFAULT_SHARD_SIZE) -> List[Tuple[int, int]]:
+    return [
+        (i, min(shard_size, n_games - i*shard_size))
+        for i in range((n_games + shard_size - 1) // shard_size)
+    ]
+
+def run_tag(crn: bool, anti: bool, cv: bool) -> str:
+    return ("anti" if anti else "crn" if crn else "") + ("cv" if cv else "")
+
+def _run_shards(jobs: List[Tuple[StratRef, int, int, int, bool, bool, bool, bool]], workers: int) -> Iterator[GameAgg]:
+    if workers <= 1 or len(jobs) <= 1 or prof.active():
+        yield from map(_run_shard, jobs)
+        return
+    ex = ProcessPoolExecutor(max_workers=min(workers, len(jobs)))
+    try:
+        yield from ex.map(_run_shard, jobs)
+    finally:
+        ex.shutdown(cancel_futures=True)
+
+def ckpt_path(strat_name: str, tag: str) -> str:
+    return os.path.join(RUNS_DIR, "%s_%s%s" % (tag, strat_name.replace(" ", "_"), CKPT_EXT))
+
+def save_ckpt(path: str, state: Dict[str, Any]) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, path)
+
+def load_ckpt(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+def _interrupted(signum: int, frame: Any) -> None:
+    raise KeyboardInterrupt
+
+def progress_line(strat_name: str, agg: GameAgg, n_games: int, rate: float) -> str:
+    est = estimate(agg.mom)
+    avg, se = (est["adj_avg"], est["adj_se"]) if est else (agg.mean(), agg.std() / agg.n ** 0.5)
+    eta = int((n_games - agg.n) / rate) if rate else 0
+    return "%s: %d/%d games, %.0f games/s, eta %d:%02d:%02d, mean %.2f ± %.2f" % (
+        strat_name, agg.n, n_games, rate, eta // 3600, eta // 60 % 60, eta % 60, avg, CI_Z * se)
+
+def run_games(strat_name: str, n_games: int, seed: Optional[int] = None,
+              workers: int = DEFAULT_WORKERS, seq: bool = False,
+              shard_size: int = DEFAULT_SHARD_SIZE, cache: bool = True, crn: bool = False,
+              anti: bool = False, ckpt: Optional[str] = None, resume: bool = False,
+              progress: bool = False, cv: bool = False) -> GameAgg:
+    plan = shards(n_games, shard_size)
+    run = None
+    if ckpt:
+        run = (strat_name, shard_size, seq, crn, anti, cv, sim_cache.strat_hash(strat_name), sim_cache.code_hash(_run_shard))
+    total = GameAgg(seq, cv)
+    start = 0
+    state = load_ckpt(ckpt) if ckpt and resume else None
+    if state and (state.get("run") != run or state["shards"] > len(plan)
+                  or state["agg"].n != sum(n for _, n in plan[:state["shards"]])):
+        print("checkpoint %s is for a different run, starting over" % ckpt, file=sys.stderr)
+        state = None
+    if state and seed in (None, state["seed"]):
+        seed, total, start = state["seed"], state["agg"], state["shards"]
+        if progress:
+            print("resuming %s from %s after %d games" % (strat_name, ckpt, total.n), file=sys.stderr)
+    elif state:
+        print("checkpoint %s is for seed %d, starting over" % (ckpt, state["seed"]), file=sys.stderr)
+    key = None
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % 2**63)
+    elif cache and sim_cache.enabled():
+        key = sim_cache.run_key(strat_name, seed, shard_size, _run_shard, tag=run_tag(crn, anti, cv))
+    todo = plan[start:]
+    parts = dict()
+    jobs = list()
+    ref = strat_ref(strat_name)
+    for idx, n in todo:
+        hit = key and sim_cache.get(key, idx, n, seq)
+        if hit:
+            parts[idx] = hit
+        else:
+            jobs.append((ref, seed, idx, n, seq or key is not None, crn, anti, cv))
+    res = _run_shards(jobs, workers)
+    t0 = last_prog = last_ckpt = time.time()
+    n0 = total.n
+    on_term = signal.signal(signal.SIGTERM, _interrupted) if ckpt else None
+    try:
+        for idx, n in todo:
+            part = parts.pop(idx, None)
+            if part is None:
+                part = next(res)
+                if key:
+                    sim_cache.put(key, idx, n, part)
+            total.merge(part)
+            start += 1
+            now = time.time()
+            if progress and now - last_prog >= PROGRESS_SECS:
+                print("\r" + progress_line(strat_name, total, n_games, (total.n - n0) / (now - t0)), end="", file=sys.stderr)
+                last_prog = now
+            if ckpt and now - last_ckpt >= CKPT_SECS:
+                save_ckpt(ckpt, {"run": run, "seed": seed, "agg": total, "shards": start})
+                last_ckpt = now
+    finally:
+        res.close()
+        if ckpt:
+            signal.signal(signal.SIGTERM, on_term)
+            if start < len(plan):
+                save_ckpt(ckpt, {"run": run, "seed": seed, "agg": total, "shards": start})
+            elif os.path.exists(ckpt):
+                os.remove(ckpt)
+        if progress and total.n > n0:
+            print("\r" + progress_line(strat_name, total, n_games, (total.n - n0) / max(time.time() - t0, 1e-9)), file=sys.stderr)
+    if key:
+        sim_cache.evict()
+    return total
@@ -1,22 +1,28 @@
+import argparse
+import sys
 import numpy as np
-import matplotlib.pyplot as plt
-from typing import Dict, List, Any
+from typing import Dict, Any, List, Optional
 from constant import (
-    DEFAULT_NUM_SIMULATIONS, FIGURE_WIDTH, FIGURE_HEIGHT, 
+    DEFAULT_NUM_SIMULATIONS, DEFAULT_WORKERS, FIGURE_WIDTH, FIGURE_HEIGHT, 
     LARGE_FIGURE_WIDTH, LARGE_FIGURE_HEIGHT, HIST_BINS, BAR_WIDTH, 
-    COMPARISON_DIR, SCORE_DIST_FILE, STRATEGY_COMP_FILE, CATEGORIES
+    COMPARISON_DIR, SCORE_DIST_FILE, STRATEGY_COMP_FILE, CATEGORIES, CI_Z
 )
 from strats import STRATEGIES
 import os
-from util import game_run, calc_stats, calc_cat_stats
+from util import calc_stats, calc_cat_stats
+from agg import GameAgg
+from runner import run_games, ckpt_path
+from cli import common_parser, apply_common
 
-def res_analyze(res: List[Dict[str, Any]], strat_name: str) -> Dict[str, Any]:
+def res_analyze(res: GameAgg, strat_name: str) -> Dict[str, Any]:
     stats = calc_stats(res)
     cat_stats = calc_cat_stats(res)
     
     print("\nanalysis for strategy: " + strat_name)
     print("basic statistics:")
-    print("\taverage score: %.2f" % stats["avg"])
+    print("\taverage score: %.2f (95%% ci %.2f - %.2f)" % (stats["avg"], *stats["ci"]))
+    print("\tcontrol variate estimate: %.2f ± %.2f (effective sample size %d, %.1fx the games run)"
+          % (stats["adj_avg"], stats["adj_se"] * CI_Z, stats["ess"], stats["ess"] / stats["n"]))
     print("\tmedian score: %.2f" % stats["med"])
     print("\tstandard deviation: %.2f" % stats["std"])
     print("\tmin score: %d/max score: %d" % (stats["min"], stats["max"]))
@@ -33,18 +39,22 @@ def res_analyze(res: List[Dict[str, Any]], strat_name: str) -> Dict[str, Any]:
     return stats
 
 def plot_dist(stats: Dict[str, Dict[str, Any]]) -> None:
+    import matplotlib.pyplot as plt
     plt.figure(figsize=(FIGURE_WIDTH, FIGURE_HEIGHT))
     for name, s in stats.items():
-        plt.hist(s["scores"], bins=HIST_BINS, alpha=0.5, label=name)
+        plt.hist(np.arange(len(s["hist"])), bins=HIST_BINS, range=(s["min"], s["max"]),
+                 weights=s["hist"], alpha=0.5, label=name)
     plt.title("score distribution by strategy")
     plt.xlabel("score")
     plt.ylabel("frequency")
     plt.legend()
     out = os.path.join(COMPARISON_DIR, SCORE_DIST_FILE)
     plt.savefig(out)
+    plt.close()
     print("\nscore distribution plot saved as '%s'" % out)
 
 def plot_comp(stats: Dict[str, Dict[str, Any]]) -> None:
+    import matplotlib.pyplot as plt
     strats = list(stats.keys())
     avgs = [s["avg"] for s in stats.values()]
     stds = [s["std"] for s in stats.values()]
@@ -64,17 +74,19 @@ def plot_comp(stats: Dict[str, Dict[str, Any]]) -> None:
     plt.tight_layout()
     out = os.path.join(COMPARISON_DIR, STRATEGY_COMP_FILE)
     plt.savefig(out)
+    plt.close(fig)
     print("strategy comparison chart saved as '%s'" % out)
 
-def run_sim() -> None:
-    n_sims = DEFAULT_NUM_SIMULATIONS
+def run_sim(n_sims: int = DEFAULT_NUM_SIMULATIONS, workers: int = DEFAULT_WORKERS,
+            seed: Optional[int] = None, anti: bool = False, resume: bool = False) -> None:
     print("running yahtzee simulation (%d games per strategy)\n" % n_sims)
 
     stats = dict()
 
     for name in STRATEGIES:
         print("simulating %s strategy.." % name)
-        res = [game_run(name) for _ in range(n_sims)]
+        res = run_games(name, n_sims, seed, workers, anti=anti, ckpt=ckpt_path(name, "sim"), resume=resume,
+                        progress=True, cv=True)
         stats[name] = res_analyze(res, name)
 
     print("\n\nstrategy comparison summary")
@@ -83,6 +95,7 @@ def run_sim() -> None:
     for i, (name, s) in enumerate(sorted_stats):
         print("%d. %s:" % (i+1, name))
         print("\taverage: %.2f ± %.2f" % (s['avg'], s['std']))
+        print("\tadjusted average: %.2f ± %.2f (95%% ci)" % (s['adj_avg'], s['adj_se'] * CI_Z))
         print("\tmedian: %.2f" % s['med'])
         print("\tbonus rate: %.2f%%" % s['bonus_pct'])
         print("\tyahtzee rate: %.2f%%" % s['ytz_pct'])
@@ -92,4 +105,21 @@ def run_sim() -> None:
     plot_dist(stats)
     plot_comp(stats)
 
-run_sim()
\ No newline at end of file
+def resume_sim(n_sims: int = DEFAULT_NUM_SIMULATIONS, workers: int = DEFAULT_WORKERS,
+               seed: Optional[int] = None, anti: bool = False, resume: bool = False) -> None:
+    try:
+        run_sim(n_sims, workers, seed, anti, resume)
+    except KeyboardInterrupt:
+        print("\ninterrupted, checkpoint saved; rerun with --resume to continue", file=sys.stderr)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="yahtzee strategy simulation", parents=[common_parser()])
+    parser.add_argument("--games", type=int, default=DEFAULT_NUM_SIMULATIONS)
+    parser.add_argument("--antithetic", action="store_true", help="play games in pairs on mirrored (7 - d) dice (widens intervals for the built-in strategies)")
+    parser.add_argument("--resume", action="store_true", help="continue from the checkpoints of an interrupted run")
+    args = parser.parse_args(argv)
+    apply_common(args)
+    resume_sim(args.games, args.workers, args.seed, args.antithetic, args.resume)
+
+if __name__ == "__main__":
+    main()
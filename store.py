@@ -0,0 +1,166 @@
+import argparse
+import json
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, Optional, List, Tuple
+from agg import GameAgg
+from batch import play_batch, has_kernels
+from logic import dice_source, sub_seed
+from strats import StratRef, strat_ref, resolve
+from constant import (
+    NUM_TURNS, NUM_CATEGORIES, CATEGORY_INDEX, RUNS_DIR, STORE_EXT, STORE_CHUNK, DEFAULT_WORKERS
+)
+
+MAGIC = b"YAHTZEE-COLS-1\n"
+HEADER_SIZE = 4096
+COLUMNS = [
+    ("score", np.uint16, ()),
+    ("all_scores", np.uint8, (NUM_CATEGORIES,)),
+    ("cats", np.uint8, (NUM_TURNS,)),
+]
+
+def _layout(capacity: int) -> Dict[str, int]:
+    offs = dict()
+    pos = HEADER_SIZE
+    for name, dtype, shape in COLUMNS:
+        offs[name] = pos
+        pos += capacity * int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+    offs["end"] = pos
+    return offs
+
+def _write_header(f, meta: Dict[str, Any]) -> None:
+    raw = MAGIC + json.dumps(meta).encode()
+    if len(raw) > HEADER_SIZE:
+        raise ValueError("store header too large")
+    f.seek(0)
+    f.write(raw.ljust(HEADER_SIZE, b"\0"))
+    f.flush()
+
+def _read_header(path: str) -> Dict[str, Any]:
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+    if not raw.startswith(MAGIC):
+        raise ValueError("%s is not a result store" % path)
+    return json.loads(raw[len(MAGIC):].rstrip(b"\0"))
+
+def results_to_cols(res: List[Dict[str, Any]]) -> Dict[str, np.ndarray]:
+    return {
+        "score": np.array([r["score"] for r in res]),
+        "all_scores": np.array([
+            [sc or 0 for sc in r["all_scores"].values()] for r in res
+        ]).reshape(-1, NUM_CATEGORIES),
+        "cats": np.array([[CATEGORY_INDEX[c] for c in r["cats"]] for r in res]).reshape(-1, NUM_TURNS)
+    }
+
+def _scalar_chunk(args: Tuple[StratRef, int, int]) -> Dict[str, np.ndarray]:
+    from util import game_run
+    ref, seed, n = args
+    strat_name = resolve(ref)
+    src = dice_source(seed)
+    return results_to_cols([game_run(strat_name, src) for _ in range(n)])
+
+def _scalar_chunks(jobs: List[Tuple[StratRef, int, int]], workers: int) -> Iterator[Dict[str, np.ndarray]]:
+    if workers <= 1 or len(jobs) <= 1:
+        yield from map(_scalar_chunk, jobs)
+        return
+    ex = ProcessPoolExecutor(max_workers=min(workers, len(jobs)))
+    try:
+        yield from ex.map(_scalar_chunk, jobs)
+    finally:
+        ex.shutdown(cancel_futures=True)
+
+class StoreWriter:
+    def __init__(self, path: str, capacity: int, meta: Optional[Dict[str, Any]] = None):
+        self.path = path
+        self.meta = dict(meta or {}, n=0, capacity=capacity)
+        self.offs = _layout(capacity)
+        self.f = open(path, "w+b")
+        self.f.truncate(self.offs["end"])
+        _write_header(self.f, self.meta)
+
+    def append(self, cols: Dict[str, np.ndarray]) -> None:
+        n = self.meta["n"]
+        k = len(cols["score"])
+        if n + k > self.meta["capacity"]:
+            raise ValueError("store capacity exceeded")
+        for name, dtype, shape in COLUMNS:
+            row = np.dtype(dtype).itemsize * int(np.prod(shape, dtype=np.int64))
+            self.f.seek(self.offs[name] + n * row)
+            self.f.write(np.ascontiguousarray(cols[name], dtype=dtype).tobytes())
+        self.meta["n"] = n + k
+        _write_header(self.f, self.meta)
+
+    def close(self) -> None:
+        self.f.close()
+
+    def __enter__(self) -> "StoreWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class ResultStore:
+    def __init__(self, path: str):
+        self.path = path
+        self.meta = _read_header(path)
+        self.n = self.meta["n"]
+        offs = _layout(self.meta["capacity"])
+        self.cols: Dict[str, np.ndarray] = {
+            name: np.memmap(path, dtype=dtype, mode="r", offset=offs[name], shape=(self.n,) + shape)
+            if self.n else np.zeros((0,) + shape, dtype=dtype)
+            for name, dtype, shape in COLUMNS
+        }
+
+    def __len__(self) -> int:
+        return self.n
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.cols[name]
+
+    def to_agg(self, seq: bool = False, chunk: int = STORE_CHUNK) -> GameAgg:
+        agg = GameAgg(seq)
+        for i in range(0, self.n, chunk):
+            agg.add_batch(*(np.asarray(self.cols[name][i:i + chunk]) for name, _, _ in COLUMNS))
+        return agg
+
+def open_store(path: str) -> ResultStore:
+    return ResultStore(path)
+
+def store_path(strat_name: str, n_games: int, seed: int) -> str:
+    name = "%s_%d_%d%s" % (strat_name.replace(" ", "_"), n_games, seed, STORE_EXT)
+    return os.path.join(RUNS_DIR, name)
+
+def sim_to_store(strat_name: str, n_games: int, path: Optional[str] = None, seed: int = 0,
+                 chunk: int = STORE_CHUNK, scalar: Optional[bool] = None,
+                 workers: int = DEFAULT_WORKERS) -> ResultStore:
+    if scalar is None:
+        scalar = not has_kernels(strat_name)
+    path = path or store_path(strat_name, n_games, seed)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    meta = {"strategy": strat_name, "seed": seed, "chunk": chunk, "engine": "scalar" if scalar else "batch"}
+    jobs = [(strat_name, sub_seed(seed, i), min(chunk, n_games - start)) for i, start in enumerate(range(0, n_games, chunk))]
+    with StoreWriter(path, n_games, meta) as w:
+        if scalar:
+            ref = strat_ref(strat_name)
+            for cols in _scalar_chunks([(ref,) + job[1:] for job in jobs], workers):
+                w.append(cols)
+        else:
+            for name, sd, n in jobs:
+                w.append(play_batch(name, n, sd))
+    return open_store(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="simulate a strategy into a columnar result store")
+    parser.add_argument("strategy")
+    parser.add_argument("games", type=int)
+    parser.add_argument("--out", default=None, help="store file (default: %s/<name>%s)" % (RUNS_DIR, STORE_EXT))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scalar", action="store_true", default=None,
+                        help="play games one at a time (default for strategies without batch kernels)")
+    parser.add_argument("--batch", dest="scalar", action="store_false",
+                        help="use the batch engine even without batch kernels")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="processes for the scalar engine")
+    args = parser.parse_args()
+    st = sim_to_store(args.strategy, args.games, args.out, args.seed, scalar=args.scalar, workers=args.workers)
+    print("wrote %d games to '%s' (%d bytes)" % (len(st), st.path, os.path.getsize(st.path)))
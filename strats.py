@@ -1,31 +1,42 @@
+import inspect
+import json
+import numpy as np
 from collections import Counter
-from typing import List, Dict, Callable
+from itertools import permutations, product
+from typing import Any, List, Dict, Callable, Optional, Tuple, Union
 from logic import (
     calc_upper, calc_n_of_kind, calc_full_house, 
-    calc_str, calc_yahtzee, Scorecard
+    calc_str, calc_yahtzee, Scorecard, HANDS, NUM_CODES, dice_code_arr, hand_idx_arr
 )
+from optimal import opt_re, opt_turn
+from memo import reads, memoize, memoize_strategies
 from constant import (
-    VALUES, CATEGORIES, SECTION_UPPER, SECTION_LOWER,
+    NUM_DICE, NUM_SIDES, NUM_CATEGORIES, ALL_CATEGORIES, CATEGORY_INDEX, VALUES, CATEGORIES, SECTION_UPPER, SECTION_LOWER,
     CATEGORY_ACES, CATEGORY_TWOS,
     CATEGORY_THREE_OF_A_KIND, CATEGORY_FOUR_OF_A_KIND, CATEGORY_FULL_HOUSE,
     CATEGORY_SMALL_STRAIGHT, CATEGORY_LARGE_STRAIGHT, CATEGORY_YAHTZEE, CATEGORY_CHANCE,
-    UPPER_SECTION_BONUS_THRESHOLD
+    UPPER_SECTION_BONUS_THRESHOLD, TUNED_FILE
 )
 
+def mode_re(dice: List[int], card: Scorecard) -> List[int]:
+    cnts = Counter(dice)
+    mode, _ = cnts.most_common(1)[0]
+    return [d for d in dice if d == mode]
+
+@reads("avail_upper")
 def upper_strat_re(dice: List[int], card: Scorecard) -> List[int]:
     avail = [
         cat for cat in CATEGORIES[SECTION_UPPER] if not card.is_cat_used(cat)
     ]
     if not avail:
-        cnts = Counter(dice)
-        mode, _ = cnts.most_common(1)[0]
-        return [d for d in dice if d == mode]
+        return mode_re(dice, card)
     for v in range(6, 0, -1):
         cat = [k for k, val in VALUES.items() if val == v][0]
         if cat in avail:
             return [d for d in dice if d == v]
     return []
 
+@reads("avail", order_free=True)
 def upper_strat_turn(dice: List[int], card: Scorecard) -> str:
     avail = card.get_avail_cats()
     best_cat = None
@@ -52,6 +63,7 @@ def upper_strat_turn(dice: List[int], card: Scorecard) -> str:
             return cat
     return avail[0]
 
+@reads(order_free=True)
 def hybrid_strat_re(dice: List[int], card: Scorecard) -> List[int]:
     cnts = Counter(dice)
     if 5 in cnts.values(): return dice
@@ -81,6 +93,7 @@ def hybrid_strat_re(dice: List[int], card: Scorecard) -> List[int]:
     return [max(dice)]
 
 
+@reads("avail", order_free=True)
 def hybrid_strat_turn(dice: List[int], card: Scorecard) -> str:
     avail = card.get_avail_cats()
     
@@ -113,6 +126,7 @@ def hybrid_strat_turn(dice: List[int], card: Scorecard) -> str:
     if CATEGORY_CHANCE in avail: return CATEGORY_CHANCE
     return avail[0]
 
+@reads()
 def win_or_bust_re(dice: List[int], card: Scorecard) -> List[int]:
     cnts = Counter(dice)
     most = cnts.most_common(1)
@@ -122,6 +136,7 @@ def win_or_bust_re(dice: List[int], card: Scorecard) -> List[int]:
             return [d for d in dice if d == val]
     return [max(dice)] if dice else list()
 
+@reads("avail", order_free=True)
 def win_or_bust_turn(dice: List[int], card: Scorecard) -> str:
     avail = card.get_avail_cats()
     
@@ -145,6 +160,7 @@ def win_or_bust_turn(dice: List[int], card: Scorecard) -> str:
     
     return avail[0]
 
+@reads()
 def low_priority_re(dice: List[int], card: Scorecard) -> List[int]:
     cnts = Counter(dice)
     uniq = sorted(list(set(dice)))
@@ -179,12 +195,15 @@ def low_priority_re(dice: List[int], card: Scorecard) -> List[int]:
     
     return [max(dice)] if dice else []
 
-def low_priority_turn(dice: List[int], card: Scorecard) -> str:
+LOW_PRI = (
+    CATEGORY_YAHTZEE, CATEGORY_LARGE_STRAIGHT, CATEGORY_SMALL_STRAIGHT, CATEGORY_FULL_HOUSE,
+    CATEGORY_FOUR_OF_A_KIND, CATEGORY_THREE_OF_A_KIND
+)
+
+@reads("avail", order_free=True)
+def low_priority_turn(dice: List[int], card: Scorecard, pri: Tuple[str, ...] = LOW_PRI) -> str:
     avail = card.get_avail_cats()
     
-    pri = [CATEGORY_YAHTZEE, CATEGORY_LARGE_STRAIGHT, CATEGORY_SMALL_STRAIGHT, CATEGORY_FULL_HOUSE, 
-                     CATEGORY_FOUR_OF_A_KIND, CATEGORY_THREE_OF_A_KIND]
-    
     for cat in pri:
         if cat in avail:
             sc = 0
@@ -213,17 +232,19 @@ def low_priority_turn(dice: List[int], card: Scorecard) -> str:
     
     return avail[0]
 
-def adapt_strat_re(dice: List[int], card: Scorecard) -> List[int]:
-    filled = sum(1 for sc in card.scores.values() if sc is not None)
-    
-    if filled < 4:
-        return early_re(dice, card)
-    elif filled < 9:
-        return mid_re(dice, card)
+@reads("avail", "upper")
+def adapt_strat_re(dice: List[int], card: Scorecard, early: int = 4, mid: int = 9,
+                   need: float = 10, hi_val: int = 4, hi_pair: int = 4) -> List[int]:
+    filled = card.filled
+    
+    if filled < early:
+        return early_re(dice, card, hi_val, hi_pair)
+    elif filled < mid:
+        return mid_re(dice, card, need)
     else:
         return late_re(dice, card)
 
-def early_re(dice: List[int], card: Scorecard) -> List[int]:
+def early_re(dice: List[int], card: Scorecard, hi_val: int = 4, hi_pair: int = 4) -> List[int]:
     cnts = Counter(dice)
     uniq = sorted(list(set(dice)))
     
@@ -241,24 +262,24 @@ def early_re(dice: List[int], card: Scorecard) -> List[int]:
     
     if 3 in cnts.values():
         val = [k for k, v in cnts.items() if v == 3][0]
-        if val >= 4:
+        if val >= hi_val:
             return [d for d in dice if d == val]
     
-    hi_pairs = [k for k, v in cnts.items() if v == 2 and k >= 4]
+    hi_pairs = [k for k, v in cnts.items() if v == 2 and k >= hi_pair]
     if hi_pairs:
         return [d for d in dice if d in hi_pairs]
     
     return [d for d in dice if cnts[d] > 1] or [max(dice)]
 
-def mid_re(dice: List[int], card: Scorecard) -> List[int]:
+def mid_re(dice: List[int], card: Scorecard, need: float = 10) -> List[int]:
     cnts = Counter(dice)
     up_sc = card.get_upper()
-    up_filled = sum(1 for cat in CATEGORIES[SECTION_UPPER] if card.scores[cat] is not None)
+    up_filled = card.get_upper_filled()
     up_left = 6 - up_filled
     if up_left > 0 and up_sc < UPPER_SECTION_BONUS_THRESHOLD:
         pts_needed = UPPER_SECTION_BONUS_THRESHOLD - up_sc
         avg_need = pts_needed/up_left
-        if avg_need > 10:
+        if avg_need > need:
             hi = [d for d in dice if d >= 4]
             if hi:
                 return hi
@@ -310,9 +331,10 @@ def late_re(dice: List[int], card: Scorecard) -> List[int]:
     
     return sorted(dice, reverse=True)[:3]
 
-def adapt_strat_turn(dice: List[int], card: Scorecard) -> str:
+@reads("avail", "upper", order_free=True)
+def adapt_strat_turn(dice: List[int], card: Scorecard, early: int = 4, mid: int = 9) -> str:
     avail = card.get_avail_cats()
-    filled = sum(1 for sc in card.scores.values() if sc is not None)
+    filled = card.filled
     
     scs = {}
     
@@ -328,14 +350,14 @@ def adapt_strat_turn(dice: List[int], card: Scorecard) -> str:
         if cat in avail:
             scs[cat] = calc_upper(dice, VALUES[cat])
     
-    if filled < 4:
+    if filled < early:
         good = {k: v for k, v in scs.items() if v > 0}
         if good:
             return max(good, key=good.get)
     
-    elif filled < 9:
+    elif filled < mid:
         up_sc = card.get_upper()
-        up_filled = sum(1 for cat in CATEGORIES[SECTION_UPPER] if card.scores[cat] is not None)
+        up_filled = card.get_upper_filled()
         up_left = 6 - up_filled
         
         if up_left > 0 and up_sc < UPPER_SECTION_BONUS_THRESHOLD:
@@ -362,25 +384,159 @@ def adapt_strat_turn(dice: List[int], card: Scorecard) -> str:
         return min(scs, key=scs.get)
     return avail[0]
 
+def pad_keep(keep: List[int]) -> List[int]:
+    return list(keep) + [0] * (NUM_DICE - len(keep))
+
+def by_hand(re_func: Callable) -> Callable:
+    table = list()
+    def batch_re(dice: np.ndarray, card) -> np.ndarray:
+        if not table:
+            hands = np.array(list(product(range(1, NUM_SIDES + 1), repeat=NUM_DICE)), dtype=np.int8)
+            keeps = np.zeros((NUM_CODES, NUM_DICE), dtype=np.int8)
+            keeps[dice_code_arr(hands)] = [pad_keep(re_func(h, Scorecard())) for h in hands.tolist()]
+            table.append(keeps)
+        return table[0][dice_code_arr(dice)]
+    return batch_re
+
+def mask_card(mask: int) -> Scorecard:
+    card = Scorecard()
+    for i, cat in enumerate(ALL_CATEGORIES):
+        if mask >> i & 1:
+            card.set_score(cat, 0)
+    return card
+
+def by_avail(turn_func: Callable) -> Callable:
+    tables = list()
+    def batch_turn(dice: np.ndarray, card) -> np.ndarray:
+        if not tables:
+            tables.append(np.full(len(HANDS) << NUM_CATEGORIES, -1, dtype=np.int8))
+        table = tables[0]
+        idx = hand_idx_arr(dice).astype(np.int64) << NUM_CATEGORIES | card.mask()
+        for i in np.unique(idx[table[idx] < 0]).tolist():
+            hand = list(HANDS[i >> NUM_CATEGORIES])
+            table[i] = CATEGORY_INDEX[turn_func(hand, mask_card(i & (1 << NUM_CATEGORIES) - 1))]
+        return table[idx]
+    return batch_turn
+
+_mode_batch_re = by_hand(mode_re)
+
+def upper_strat_batch_re(dice: np.ndarray, card) -> np.ndarray:
+    avail = ~card.used[:, :NUM_SIDES]
+    val = NUM_SIDES - np.argmax(avail[:, ::-1], axis=1)
+    cnt = (dice == val[:, None]).sum(axis=1)
+    keep = np.where(np.arange(NUM_DICE) < cnt[:, None], val[:, None], 0).astype(np.int8)
+    none = ~avail.any(axis=1)
+    if none.any():
+        keep[none] = _mode_batch_re(dice[none], card)
+    return keep
+
 STRATEGIES: Dict[str, Dict[str, Callable]] = {
     "greedy upper section": {
         "reroll": upper_strat_re,
-        "score": upper_strat_turn
+        "score": upper_strat_turn,
+        "batch_reroll": upper_strat_batch_re,
+        "batch_score": by_avail(upper_strat_turn)
     },
     "hybrid probability": {
         "reroll": hybrid_strat_re,
-        "score": hybrid_strat_turn
+        "score": hybrid_strat_turn,
+        "batch_reroll": by_hand(hybrid_strat_re),
+        "batch_score": by_avail(hybrid_strat_turn)
     },
     "yahtzee or bust": {
         "reroll": win_or_bust_re,
-        "score": win_or_bust_turn
+        "score": win_or_bust_turn,
+        "batch_reroll": by_hand(win_or_bust_re),
+        "batch_score": by_avail(win_or_bust_turn)
     },
     "lower section priority": {
         "reroll": low_priority_re,
-        "score": low_priority_turn
+        "score": low_priority_turn,
+        "batch_reroll": by_hand(low_priority_re),
+        "batch_score": by_avail(low_priority_turn)
     },
     "adaptive strategy": {
         "reroll": adapt_strat_re,
         "score": adapt_strat_turn
+    },
+    "optimal": {
+        "reroll": opt_re,
+        "score": opt_turn
     }
-}
\ No newline at end of file
+}
+
+memoize_strategies(STRATEGIES)
+
+PARAM_SPACES: Dict[str, Dict[str, List[Any]]] = {
+    "adaptive strategy": {
+        "early": [2, 3, 4, 5, 6],
+        "mid": [7, 8, 9, 10, 11],
+        "need": [6, 8, 10, 12, 14],
+        "hi_val": [2, 3, 4, 5, 6],
+        "hi_pair": [2, 3, 4, 5, 6]
+    },
+    "lower section priority": {
+        "pri": list(permutations(LOW_PRI))
+    }
+}
+
+def default_params(strat_name: str) -> Dict[str, Any]:
+    strat = STRATEGIES[strat_name]
+    res = dict()
+    for kind in ("reroll", "score"):
+        sig = inspect.signature(inspect.unwrap(strat[kind])).parameters
+        res.update({k: sig[k].default for k in PARAM_SPACES[strat_name] if k in sig})
+    return res
+
+def tuned(fn: Callable, params: Dict[str, Any]) -> Callable:
+    fn = inspect.unwrap(fn)
+    sig = inspect.signature(fn).parameters
+    own = {k: tuple(v) if isinstance(v, list) else v for k, v in sorted(params.items()) if k in sig}
+    if not own:
+        return fn
+    def tuned_fn(dice: List[int], card: Scorecard, *left):
+        return fn(dice, card, *left, **own)
+    tuned_fn.__name__ = fn.__name__
+    tuned_fn.__dict__.update(fn.__dict__)
+    tuned_fn.params = own
+    tuned_fn.base = fn
+    return tuned_fn
+
+def register_tuned(strat_name: str, base: str, params: Dict[str, Any]) -> str:
+    entry = dict()
+    for kind in ("reroll", "score"):
+        fn = tuned(STRATEGIES[base][kind], params)
+        entry[kind] = memoize(fn)
+        batch = "batch_" + kind
+        if batch in STRATEGIES[base]:
+            entry[batch] = (by_hand if kind == "reroll" else by_avail)(fn) if hasattr(fn, "params") else STRATEGIES[base][batch]
+    entry["tuned"] = (base, dict(params))
+    STRATEGIES[strat_name] = entry
+    return strat_name
+
+StratRef = Union[str, Tuple[str, str, Dict[str, Any]]]
+
+def strat_ref(strat_name: str) -> StratRef:
+    spec = STRATEGIES[strat_name].get("tuned")
+    return (strat_name,) + spec if spec else strat_name
+
+def resolve(ref: StratRef) -> str:
+    if isinstance(ref, str):
+        return ref
+    name, base, params = ref
+    if name not in STRATEGIES or STRATEGIES[name].get("tuned") != (base, params):
+        register_tuned(name, base, params)
+    return name
+
+def load_tuned(names: Optional[List[str]] = None, path: str = TUNED_FILE) -> List[str]:
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return list()
+    res = list()
+    for base, tuned_res in saved.items():
+        name = "%s (tuned)" % base
+        if base in PARAM_SPACES and (names is None or name in names):
+            res.append(register_tuned(name, base, tuned_res["params"]))
+    return res
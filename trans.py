@@ -0,0 +1,132 @@
+import numpy as np
+from collections import Counter
+from functools import lru_cache
+from itertools import combinations, combinations_with_replacement, product
+from math import factorial
+from typing import Any, Callable, Dict, List, Tuple
+from logic import HANDS, HAND_IDX, NUM_CODES
+from constant import NUM_DICE, NUM_SIDES
+
+KEEPS: List[Tuple[int, ...]] = [
+    k for m in range(NUM_DICE + 1) for k in combinations_with_replacement(range(1, NUM_SIDES + 1), m)
+]
+KEEP_IDX = {k: i for i, k in enumerate(KEEPS)}
+_W = [(NUM_SIDES + 1) ** i for i in range(NUM_DICE)]
+KEEP_CODES = np.array([sum(d * w for d, w in zip(k, _W)) for k in KEEPS], dtype=np.int64)
+
+def _outcomes(n: int) -> List[Tuple[Tuple[int, ...], float]]:
+    res = list()
+    for o in combinations_with_replacement(range(1, NUM_SIDES + 1), n):
+        ways = factorial(n)
+        for c in Counter(o).values():
+            ways //= factorial(c)
+        res.append((o, ways / NUM_SIDES**n))
+    return res
+
+def _keep_csr() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    outs = {n: _outcomes(n) for n in range(NUM_DICE + 1)}
+    ptr, idx, prob = [0], list(), list()
+    for k in KEEPS:
+        row = sorted((HAND_IDX[tuple(sorted(k + o))], p) for o, p in outs[NUM_DICE - len(k)])
+        idx += [h for h, _ in row]
+        prob += [p for _, p in row]
+        ptr.append(len(idx))
+    return np.array(ptr), np.array(idx), np.array(prob)
+
+def _sub_csr() -> Tuple[np.ndarray, np.ndarray]:
+    subs = [sorted({KEEP_IDX[k] for m in range(NUM_DICE + 1) for k in combinations(h, m)}) for h in HANDS]
+    return np.cumsum([0] + [len(s) for s in subs]), np.concatenate(subs)
+
+def _ordered_csr() -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    rows = [list() for _ in range(NUM_CODES)]
+    for k in range(NUM_DICE):
+        tails = [sum(d * _W[k + j] for j, d in enumerate(t)) for t in product(range(1, NUM_SIDES + 1), repeat=NUM_DICE - k)]
+        for t in product(range(1, NUM_SIDES + 1), repeat=k):
+            code = sum(d * m for d, m in zip(t, _W))
+            rows[code] = [code + s for s in tails]
+    ptr = np.cumsum([0] + [len(r) for r in rows])
+    idx = np.array([c for r in rows for c in r], dtype=np.int64)
+    prob = np.repeat(float(NUM_SIDES) ** -(NUM_DICE - _codes()["CODE_LEN"]), np.diff(ptr))
+    return ptr, idx, prob
+
+@lru_cache(maxsize=None)
+def _codes() -> Dict[str, Any]:
+    arr = (np.arange(NUM_CODES)[:, None] // np.array(_W) % (NUM_SIDES + 1)).astype(np.int8)
+    keeps_of = [tuple(int(d) for d in row if d) for row in arr]
+    code_len = (arr > 0).sum(axis=1)
+    return {
+        "KEEP_ARR": arr, "KEEPS_OF": keeps_of, "CODE_LEN": code_len,
+        "CODE_KEEP": np.array([KEEP_IDX.get(tuple(sorted(k)), -1) for k in keeps_of]),
+        "FULL_CODES": np.flatnonzero(code_len == NUM_DICE)
+    }
+
+@lru_cache(maxsize=None)
+def _keeps() -> Dict[str, Any]:
+    ptr, out, prob = _keep_csr()
+    sub_ptr, sub_keep = _sub_csr()
+    subs = [sub_keep[a:b].tolist() for a, b in zip(sub_ptr[:-1], sub_ptr[1:])]
+    hand_p = np.zeros(len(HANDS))
+    hand_p[out[ptr[0]:ptr[1]]] = prob[ptr[0]:ptr[1]]
+    return {
+        "KEEP_PTR": ptr, "KEEP_OUT": out, "KEEP_PROB": prob, "KEEP_ROW": np.repeat(np.arange(len(KEEPS)), np.diff(ptr)),
+        "SUB_PTR": sub_ptr, "SUB_KEEP": sub_keep, "HAND_SUBS": subs,
+        "SUB_ARR": np.array([s + [s[0]] * (max(map(len, subs)) - len(s)) for s in subs]), "HAND_P": hand_p
+    }
+
+@lru_cache(maxsize=None)
+def _ordered() -> Dict[str, Any]:
+    ptr, out, prob = _ordered_csr()
+    return {"ORD_PTR": ptr, "ORD_OUT": out, "ORD_PROB": prob, "ORD_ROW": np.repeat(np.arange(NUM_CODES), np.diff(ptr))}
+
+_LAZY: Dict[str, Callable[[], Dict[str, Any]]] = {
+    name: fn for fn, names in (
+        (_codes, ("KEEP_ARR", "KEEPS_OF", "CODE_LEN", "CODE_KEEP", "FULL_CODES")),
+        (_keeps, ("KEEP_PTR", "KEEP_OUT", "KEEP_PROB", "KEEP_ROW", "SUB_PTR", "SUB_KEEP", "HAND_SUBS", "SUB_ARR", "HAND_P")),
+        (_ordered, ("ORD_PTR", "ORD_OUT", "ORD_PROB", "ORD_ROW"))
+    ) for name in names
+}
+
+def __getattr__(name: str) -> Any:
+    if name not in _LAZY:
+        raise AttributeError("module %r has no attribute %r" % (__name__, name))
+    tabs = _LAZY[name]()
+    globals().update(tabs)
+    return tabs[name]
+
+@lru_cache(maxsize=None)
+def _keep_dense() -> np.ndarray:
+    t = _keeps()
+    dense = np.zeros((len(HANDS), len(KEEPS)))
+    dense[t["KEEP_OUT"], t["KEEP_ROW"]] = t["KEEP_PROB"]
+    return dense
+
+def keep_ev(v: np.ndarray) -> np.ndarray:
+    return v @ _keep_dense()
+
+def keep_ev_sparse(v: np.ndarray, keeps: np.ndarray) -> np.ndarray:
+    t = _keeps()
+    lo, hi = t["KEEP_PTR"][keeps], t["KEEP_PTR"][keeps + 1]
+    nnz = np.concatenate([np.arange(a, b) for a, b in zip(lo.tolist(), hi.tolist())])
+    return np.add.reduceat(v[..., t["KEEP_OUT"][nnz]] * t["KEEP_PROB"][nnz], np.cumsum(hi - lo) - (hi - lo), axis=-1)
+
+def best_val(ek: np.ndarray) -> np.ndarray:
+    return ek[..., _keeps()["SUB_ARR"]].max(axis=-1)
+
+def best_keep(ek: np.ndarray) -> np.ndarray:
+    sub = _keeps()["SUB_ARR"]
+    return sub[np.arange(len(HANDS)), ek[..., sub].argmax(axis=-1)]
+
+def hand_keep_ev(v: np.ndarray, h: int) -> Tuple[np.ndarray, np.ndarray]:
+    t = _keeps()
+    keeps = t["SUB_KEEP"][t["SUB_PTR"][h]:t["SUB_PTR"][h + 1]]
+    return keeps, keep_ev_sparse(v, keeps)
+
+def push(p: np.ndarray, keeps: np.ndarray) -> np.ndarray:
+    t = _keeps()
+    mass = np.bincount(keeps, p, len(KEEPS))
+    return np.bincount(t["KEEP_OUT"], mass[t["KEEP_ROW"]] * t["KEEP_PROB"], len(HANDS))
+
+def push_ordered(p: np.ndarray, codes: np.ndarray) -> np.ndarray:
+    t = _ordered()
+    mass = np.bincount(codes, p, NUM_CODES)
+    return np.bincount(t["ORD_OUT"], mass[t["ORD_ROW"]] * t["ORD_PROB"], NUM_CODES)
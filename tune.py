@@ -0,0 +1,146 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+from math import prod
+from typing import Any, Dict, List, Optional
+from agg import GameAgg
+from runner import _run_shards, shards
+from logic import sub_seed
+from strats import STRATEGIES, PARAM_SPACES, default_params, register_tuned, strat_ref
+from cli import common_parser, apply_common, strat_arg
+from constant import (
+    DEFAULT_WORKERS, DEFAULT_SEED, TUNED_FILE, TUNE_CONFIGS, TUNE_ETA, TUNE_MIN_GAMES, TUNE_FINAL_GAMES,
+    TUNE_SHARD_SIZE, CI_Z
+)
+
+def sample_configs(strat_name: str, n: int, rng: np.random.Generator) -> List[Dict[str, Any]]:
+    space = PARAM_SPACES[strat_name]
+    res = [default_params(strat_name)]
+    seen = {repr(res[0])}
+    while len(res) < min(n, prod(len(v) for v in space.values())):
+        cfg = {k: vals[rng.integers(len(vals))] for k, vals in space.items()}
+        if repr(cfg) not in seen:
+            seen.add(repr(cfg))
+            res.append(cfg)
+    return res
+
+def _cand(name: str, base: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {"name": register_tuned(name, base, params), "params": params, "agg": GameAgg(True), "shards": 0}
+
+def _extend(cands: List[Dict[str, Any]], n_games: int, seed: int, workers: int) -> None:
+    jobs = list()
+    owners = list()
+    for c in cands:
+        for idx, n in shards(n_games, TUNE_SHARD_SIZE)[c["shards"]:]:
+            jobs.append((strat_ref(c["name"]), seed, idx, n, True, True, False, False))
+            owners.append(c)
+    for c, part in zip(owners, _run_shards(jobs, workers)):
+        c["agg"].merge(part)
+        c["shards"] += 1
+
+def _ci(scores: np.ndarray) -> float:
+    return CI_Z * float(np.std(scores, ddof=1)) / len(scores) ** 0.5
+
+def fmt_params(params: Dict[str, Any]) -> str:
+    return ", ".join("%s=%s" % (k, "/".join(v) if isinstance(v, tuple) else v) for k, v in params.items())
+
+def halving(strat_name: str, n_configs: int = TUNE_CONFIGS, eta: int = TUNE_ETA,
+            min_games: int = TUNE_MIN_GAMES, final_games: int = TUNE_FINAL_GAMES,
+            seed: int = DEFAULT_SEED, workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    if strat_name not in PARAM_SPACES:
+        raise ValueError("%s has no parameter space (tunable: %s)" % (strat_name, ", ".join(PARAM_SPACES)))
+    t = time.time()
+    configs = sample_configs(strat_name, n_configs, np.random.default_rng(seed))
+    cands = [_cand("%s #%d" % (strat_name, i), strat_name, p) for i, p in enumerate(configs)]
+    pool = list(cands)
+    games = -(-min_games // TUNE_SHARD_SIZE) * TUNE_SHARD_SIZE
+    total = 0
+    final = list()
+    rung = 0
+    try:
+        while True:
+            total -= sum(c["agg"].n for c in pool)
+            _extend(pool, games, seed, workers)
+            total += sum(c["agg"].n for c in pool)
+            pool.sort(key=lambda c: -c["agg"].mean())
+            print("rung %d: %d configs x %d games, mean %.2f (best) to %.2f, %.0fs" % (
+                rung, len(pool), games, pool[0]["agg"].mean(), pool[-1]["agg"].mean(), time.time() - t))
+            if len(pool) == 1:
+                break
+            pool = pool[:max(1, len(pool) // eta)]
+            games *= eta
+            rung += 1
+        best, base = pool[0], cands[0]
+        final.append(_cand("%s #best" % strat_name, strat_name, best["params"]))
+        if best is not base:
+            final.append(_cand("%s #default" % strat_name, strat_name, base["params"]))
+        _extend(final, max(final_games, TUNE_SHARD_SIZE), sub_seed(seed, 1), workers)
+    finally:
+        for c in cands + final:
+            STRATEGIES.pop(c["name"], None)
+    sc = [c["agg"].scores() for c in final]
+    diff = sc[0] - sc[-1]
+    return {
+        "params": best["params"], "avg": float(sc[0].mean()), "ci": _ci(sc[0]),
+        "default_avg": float(sc[-1].mean()), "default_ci": _ci(sc[-1]),
+        "gain": float(diff.mean()), "gain_ci": _ci(diff) if diff.any() else 0.0,
+        "games": len(sc[0]), "search_games": total, "configs": len(configs), "seed": seed, "secs": time.time() - t
+    }
+
+def save_tuned(strat_name: str, res: Dict[str, Any], path: str = TUNED_FILE) -> str:
+    try:
+        with open(path) as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        saved = dict()
+    saved[strat_name] = res
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w") as f:
+        json.dump(saved, f, indent=1)
+    os.replace(path + ".tmp", path)
+    return register_tuned("%s (tuned)" % strat_name, strat_name, res["params"])
+
+def print_tuned(strat_name: str, res: Dict[str, Any]) -> None:
+    print("\n%s: %d configs, %d search games, %.0fs" % (strat_name, res["configs"], res["search_games"], res["secs"]))
+    print("best: %s" % fmt_params(res["params"]))
+    print("default: %s" % fmt_params(default_params(strat_name)))
+    print("fresh games (common dice): %d" % res["games"])
+    print("tuned average: %.2f ± %.2f" % (res["avg"], res["ci"]))
+    print("default average: %.2f ± %.2f" % (res["default_avg"], res["default_ci"]))
+    print("score left by the defaults: %.2f ± %.2f" % (res["gain"], res["gain_ci"]))
+
+def tune(strats: List[str], n_configs: int = TUNE_CONFIGS, eta: int = TUNE_ETA, min_games: int = TUNE_MIN_GAMES,
+         final_games: int = TUNE_FINAL_GAMES, seed: int = DEFAULT_SEED, workers: int = DEFAULT_WORKERS,
+         save: bool = True) -> None:
+    for name in strats:
+        try:
+            res = halving(name, n_configs, eta, min_games, final_games, seed, workers)
+        except ValueError as e:
+            print("\n%s: not tuned (%s)" % (name, e))
+            continue
+        print_tuned(name, res)
+        if save:
+            print("saved to %s as strategy '%s'" % (TUNED_FILE, save_tuned(name, res)))
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="successive-halving search over strategy parameters",
+                                     parents=[common_parser()])
+    parser.add_argument("strategies", nargs="*", type=strat_arg, default=list(PARAM_SPACES.keys()))
+    parser.add_argument("--configs", type=int, default=TUNE_CONFIGS, help="configurations in the first rung")
+    parser.add_argument("--eta", type=int, default=TUNE_ETA, help="keep 1/eta of the configurations per rung")
+    parser.add_argument("--min-games", type=int, default=TUNE_MIN_GAMES, help="games per configuration in the first rung")
+    parser.add_argument("--final-games", type=int, default=TUNE_FINAL_GAMES,
+                        help="fresh games for the best and default configurations")
+    parser.add_argument("--dry-run", action="store_true", help="do not save the result as a strategy")
+    args = parser.parse_args(argv)
+    apply_common(args)
+    try:
+        tune(args.strategies, args.configs, args.eta, args.min_games, args.final_games, args.seed, args.workers,
+             not args.dry_run)
+    except KeyboardInterrupt:
+        print("\nexiting..")
+
+if __name__ == "__main__":
+    main()
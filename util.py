@@ -1,37 +1,48 @@
 import numpy as np
-from collections import Counter, defaultdict
-from typing import Dict, List, Any, Callable
-from logic import Scorecard, roll
+from typing import Dict, List, Any, Callable, Optional, Union
+from logic import Scorecard, DiceSource, DEFAULT_DICE, roll
+from agg import GameAgg
+from control import luck, estimate
+from store import ResultStore
 from constant import (
-    NUM_ROLLS, NUM_TURNS, CATEGORIES,
+    NUM_ROLLS, NUM_TURNS, CATEGORIES, ALL_CATEGORIES,
     UPPER_SECTION_BONUS_THRESHOLD, CATEGORY_YAHTZEE, NUM_DICE,
-    LOWER_QUARTILE, UPPER_QUARTILE
+    LOWER_QUARTILE, UPPER_QUARTILE, CI_Z
 )
 from strats import STRATEGIES
 
-def turn_init(strat_func: Callable, hand: List[int], card: Scorecard) -> List[int]:
-    for __ in range(NUM_ROLLS - 1):
-        keep = strat_func(hand, card)
+def turn_init(strat_func: Callable, hand: List[int], card: Scorecard,
+              src: Optional[DiceSource] = None, log: Optional[list] = None) -> List[int]:
+    with_left = getattr(strat_func, "rolls_left", False)
+    for left in range(NUM_ROLLS - 1, 0, -1):
+        keep = strat_func(hand, card, left) if with_left else strat_func(hand, card)
         to_reroll = NUM_DICE - len(keep)
         if to_reroll == 0:
             break
-        new = roll(to_reroll)
+        new = roll(to_reroll, src)
         hand = keep + new
+        if log is not None:
+            log.append((left - 1, keep, hand))
     return hand
 
-def game_run(strat_name: str) -> Dict[str, Any]:
+def game_run(strat_name: str, src: Optional[DiceSource] = None, cv: bool = False) -> Dict[str, Any]:
     card = Scorecard()
     strat = STRATEGIES[strat_name]
+    src = src or DEFAULT_DICE
     choices = list()
+    events = list() if cv else None
     for _ in range(NUM_TURNS):
-        hand = roll(NUM_DICE)
-        final = turn_init(strat['reroll'], hand, card)
+        src.new_turn()
+        hand = roll(NUM_DICE, src)
+        if cv:
+            events.append((NUM_ROLLS - 1, (), hand))
+        final = turn_init(strat['reroll'], hand, card, src, events)
         cat = strat['score'](final, card)
         card.rec_score(cat, final)
         choices.append(cat)
     upper = card.get_upper()
     bonus = upper >= UPPER_SECTION_BONUS_THRESHOLD
-    ytz_score = card.scores[CATEGORY_YAHTZEE]
+    ytz_score = card.get_score(CATEGORY_YAHTZEE)
     
     return {
         "score": card.get_total(),
@@ -39,57 +50,54 @@ def game_run(strat_name: str) -> Dict[str, Any]:
         "bonus": bonus,
         "ytz": ytz_score,
         "cats": choices,
-        "all_scores": dict(card.scores)
+        "all_scores": dict(card.scores),
+        "luck": luck(events) if cv else None
     }
 
-def calc_stats(res: List[Dict[str, Any]]) -> Dict[str, Any]:
-    scores = [r["score"] for r in res]
-    avg = np.mean(scores)
-    std = np.std(scores)
-    min_s = np.min(scores)
-    max_s = np.max(scores)
-    med = np.median(scores)
-    q1 = np.percentile(scores, LOWER_QUARTILE)
-    q3 = np.percentile(scores, UPPER_QUARTILE)
+def as_agg(res: Union[List[Dict[str, Any]], GameAgg, ResultStore], seq: bool = False) -> GameAgg:
+    if isinstance(res, GameAgg):
+        return res
+    if isinstance(res, ResultStore):
+        return res.to_agg(seq)
+    return GameAgg.from_results(res, seq)
+
+def calc_stats(res: Union[List[Dict[str, Any]], GameAgg, ResultStore]) -> Dict[str, Any]:
+    agg = as_agg(res)
+    avg = agg.mean()
+    std = agg.std()
     cv = (std / avg) * 100 if avg > 0 else 0
-    
-    bonus_pct = sum(
-        1 for r in res if r['bonus']
-    )/len(res) * 100
-    ytz_pct = sum(
-        1 for r in res if r["ytz"] > 0
-    )/len(res) * 100
+    se = std / agg.n ** 0.5
+    est = estimate(agg.mom) or {"se": se, "adj_avg": avg, "adj_se": se}
+    se = est["se"]
     
     return {
         "avg": avg,
         "std": std,
-        "med": med,
-        "min": min_s,
-        "max": max_s,
-        "q1": q1,
-        "q3": q3,
+        "med": agg.quantile(50),
+        "min": agg.min(),
+        "max": agg.max(),
+        "q1": agg.quantile(LOWER_QUARTILE),
+        "q3": agg.quantile(UPPER_QUARTILE),
         "cv": cv,
-        "bonus_pct": bonus_pct,
-        "ytz_pct": ytz_pct,
-        "scores": scores
+        "bonus_pct": agg.bonus/agg.n * 100,
+        "ytz_pct": agg.ytz/agg.n * 100,
+        "n": agg.n,
+        "hist": agg.hist,
+        "se": se,
+        "ci": (avg - CI_Z * se, avg + CI_Z * se),
+        "adj_avg": est["adj_avg"],
+        "adj_se": est["adj_se"],
+        "adj_ci": (est["adj_avg"] - CI_Z * est["adj_se"], est["adj_avg"] + CI_Z * est["adj_se"]),
+        "ess": std * std / est["adj_se"] ** 2 if est["adj_se"] else agg.n
     }
 
-def calc_cat_stats(res: List[Dict[str, Any]]) -> Dict[str, Dict[str, float]]:
-    cats = list()
-    for r in res:
-        cats.extend(r["cats"])
-    
-    cat_dist = Counter(cats)
-    total = len(cats)
-    
-    cat_avgs = defaultdict(list)
-    for r in res:
-        for c, s in r["all_scores"].items():
-            if s is not None:
-                cat_avgs[c].append(s)
-    
-    cat_avg = {c: np.mean(cat_scores) for c, cat_scores in cat_avgs.items()}
-    cat_pct = {c: cat_dist.get(c, 0)/total*100 for c in cat_avg.keys()}
+def calc_cat_stats(res: Union[List[Dict[str, Any]], GameAgg, ResultStore]) -> Dict[str, Dict[str, float]]:
+    agg = as_agg(res)
+    total = agg.cat_use.sum()
+    cnt = agg.cat_cnt
+    used = [(i, c) for i, c in enumerate(ALL_CATEGORIES) if cnt[i]]
+    cat_avg = {c: agg.cat_sum[i]/cnt[i] for i, c in used}
+    cat_pct = {c: agg.cat_use[i]/total*100 for i, c in used}
     
     return {"scores": cat_avg, "usage": cat_pct}
 
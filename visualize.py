@@ -1,50 +1,37 @@
+import argparse
 import numpy as np
-import matplotlib.pyplot as plt
 import os
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from constant import (
-    DEFAULT_VISUALIZATION_GAMES, DETAILED_FIGURE_WIDTH, DETAILED_FIGURE_HEIGHT,
-    HIST_BINS, RUNNING_AVG_WINDOW, STRATEGIES_DIR
+    DEFAULT_WORKERS, DEFAULT_VISUALIZATION_GAMES, DETAILED_FIGURE_WIDTH, DETAILED_FIGURE_HEIGHT,
+    HIST_BINS, RUNNING_AVG_WINDOW, STRATEGIES_DIR, ALL_CATEGORIES
 )
 from strats import STRATEGIES
-from util import game_run, calc_stats, calc_cat_stats, print_strategy_list
+from util import calc_stats, calc_cat_stats, print_strategy_list
+from runner import run_games
+from store import open_store
+from agg import GameAgg
+from cli import common_parser, apply_common
 
-def vis_strat_perf(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES) -> Dict[str, Any]:
-    print("analyzing %s over %d games.." % (strat, n_games))
-    
-    res = [game_run(strat) for _ in range(n_games)]
-    stats = calc_stats(res)
-    cat_stats = calc_cat_stats(res)
-    
-    scs = stats["scores"]
-    cat_scs = dict()
-    cat_use = dict()
-    
-    for r in res:
-        for cat, sc in r["all_scores"].items():
-            if sc is not None:
-                if cat not in cat_scs:
-                    cat_scs[cat] = []
-                cat_scs[cat].append(sc)
-        
-        for cat in r["cats"]:
-            cat_use[cat] = cat_use.get(cat, 0) + 1
-    
+def plot_strat_perf(strat: str, hist: np.ndarray, mean: float, med: float, cat_scs: Dict[str, float],
+                    cat_use: Dict[str, int], run_x: Optional[np.ndarray], run_avg: Optional[np.ndarray], win: int) -> str:
+    import matplotlib.pyplot as plt
     fig = plt.figure(figsize=(DETAILED_FIGURE_WIDTH, DETAILED_FIGURE_HEIGHT))
     ax1 = fig.add_subplot(2, 2, 1)
-    ax1.hist(scs, bins=HIST_BINS, color='skyblue', edgecolor='black')
+    lo, hi = np.flatnonzero(hist)[[0, -1]]
+    ax1.hist(np.arange(len(hist)), bins=HIST_BINS, range=(lo, hi), weights=hist, color='skyblue', edgecolor='black')
     ax1.set_title('%s score distribution' % strat)
     ax1.set_xlabel('score')
     ax1.set_ylabel('frequency')
-    ax1.axvline(np.mean(scs), color='red', linestyle='dashed', linewidth=1, 
-                label='mean: %.2f' % np.mean(scs))
-    ax1.axvline(np.median(scs), color='green', linestyle='dashed', linewidth=1,
-                label='median: %.2f' % np.median(scs))
+    ax1.axvline(mean, color='red', linestyle='dashed', linewidth=1, 
+                label='mean: %.2f' % mean)
+    ax1.axvline(med, color='green', linestyle='dashed', linewidth=1,
+                label='median: %.2f' % med)
     ax1.legend()
     
     ax2 = fig.add_subplot(2, 2, 2)
     cats = list(cat_scs.keys())
-    avgs = [np.mean(cat_scs[cat]) for cat in cats]
+    avgs = [cat_scs[cat] for cat in cats]
     
     idxs = np.argsort(avgs)
     s_cats = [cats[i] for i in idxs]
@@ -67,51 +54,85 @@ def vis_strat_perf(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES) -> Di
     ax3.set_xlabel('number of times used')
     
     ax4 = fig.add_subplot(2, 2, 4)
-    
-    win = min(RUNNING_AVG_WINDOW, n_games)
-    run_avg = np.convolve(scs, np.ones(win)/win, mode='valid')
-    
-    ax4.plot(range(len(run_avg)), run_avg, color='purple')
-    ax4.set_title('running average score (window: %d games)' % win)
-    ax4.set_xlabel('game number')
-    ax4.set_ylabel('average score')
-    ax4.axhline(np.mean(scs), color='red', linestyle='dashed', 
-                label='overall mean: %.2f' % np.mean(scs))
-    ax4.legend()
+    if run_x is None:
+        ax4.set_title('running average score (not recorded for this run)')
+        ax4.axis('off')
+    else:
+        ax4.plot(run_x, run_avg, color='purple')
+        ax4.set_title('running average score (window: %d games)' % win)
+        ax4.set_xlabel('game number')
+        ax4.set_ylabel('average score')
+        ax4.axhline(mean, color='red', linestyle='dashed',
+                    label='overall mean: %.2f' % mean)
+        ax4.legend()
     
     plt.tight_layout()
     out = os.path.join(STRATEGIES_DIR, "%s_analysis.png" % strat.replace(' ', '_'))
     plt.savefig(out)
+    plt.close(fig)
     print("visualization saved as '%s'" % out)
+    return out
+
+def strat_perf_data(strat: str, res: GameAgg, stats: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    stats = stats or calc_stats(res)
+    win = max(min(RUNNING_AVG_WINDOW, res.n), res.run_step)
+    run_x, run_avg = res.running_avg(win) or (None, None)
+    return {
+        "strat": strat, "hist": res.hist, "mean": stats["avg"], "med": stats["med"],
+        "cat_scs": calc_cat_stats(res)["scores"],
+        "cat_use": {cat: int(res.cat_use[i]) for i, cat in enumerate(ALL_CATEGORIES) if res.cat_use[i]},
+        "run_x": run_x, "run_avg": run_avg, "win": win
+    }
+
+def vis_strat_perf(strat: str, n_games: int = DEFAULT_VISUALIZATION_GAMES,
+                   workers: int = DEFAULT_WORKERS, seed: Optional[int] = None,
+                   store: Optional[str] = None) -> Dict[str, Any]:
+    if store:
+        res = open_store(store).to_agg()
+        n_games = res.n
+        print("analyzing %s over %d stored games.." % (strat, n_games))
+    else:
+        print("analyzing %s over %d games.." % (strat, n_games))
+        res = run_games(strat, n_games, seed, workers)
+    stats = calc_stats(res)
+    plot_strat_perf(**strat_perf_data(strat, res, stats))
     
     print("\nsummary statistics for %s:" % strat)
-    print("average score: %.2f" % np.mean(scs))
-    print("median score: %.2f" % np.median(scs))
-    print("standard deviation: %.2f" % np.std(scs))
-    print("min score: %d" % np.min(scs))
-    print("max score: %d" % np.max(scs))
-    
-    bonus_pct = sum(1 for r in res if r["bonus"]) / n_games*100
-    ytz_pct = sum(1 for r in res if r["ytz"] > 0) / n_games * 100
-    
-    print("upper section bonus rate: %.2f%%" % bonus_pct)
-    print("yahtzee success rate: %.2f%%" % ytz_pct)
+    print("average score: %.2f" % stats["avg"])
+    print("median score: %.2f" % stats["med"])
+    print("standard deviation: %.2f" % stats["std"])
+    print("min score: %d" % stats["min"])
+    print("max score: %d" % stats["max"])
+    print("upper section bonus rate: %.2f%%" % stats["bonus_pct"])
+    print("yahtzee success rate: %.2f%%" % stats["ytz_pct"])
     
     return stats
 
-print("yahtzee strategy visualization tool")
-print_strategy_list()
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="yahtzee strategy visualization tool", parents=[common_parser()])
+    parser.add_argument("--store", default=None, help="visualize a saved result store instead of simulating")
+    args = parser.parse_args(argv)
+    apply_common(args)
 
-strats = list(STRATEGIES.keys())
-try:
-    idx = int(input("\nselect a strategy to visualize (number): ")) - 1
-    if 0 <= idx < len(strats):
-        n = input("number of games to simulate (default: %d): " % DEFAULT_VISUALIZATION_GAMES)
-        n = int(n) if n else DEFAULT_VISUALIZATION_GAMES
-        vis_strat_perf(strats[idx], n)
-    else:
-        print("invalid strategy selection.")
-except ValueError:
-    print("please enter a valid number")
-except KeyboardInterrupt:
-    print("\nexiting..")
\ No newline at end of file
+    print("yahtzee strategy visualization tool")
+    if args.store:
+        vis_strat_perf(open_store(args.store).meta["strategy"], store=args.store)
+        return
+    print_strategy_list()
+
+    strats = list(STRATEGIES.keys())
+    try:
+        idx = int(input("\nselect a strategy to visualize (number): ")) - 1
+        if 0 <= idx < len(strats):
+            n = input("number of games to simulate (default: %d): " % DEFAULT_VISUALIZATION_GAMES)
+            n = int(n) if n else DEFAULT_VISUALIZATION_GAMES
+            vis_strat_perf(strats[idx], n, args.workers, args.seed)
+        else:
+            print("invalid strategy selection.")
+    except ValueError:
+        print("please enter a valid number")
+    except KeyboardInterrupt:
+        print("\nexiting..")
+
+if __name__ == "__main__":
+    main()